@@ -0,0 +1,54 @@
+"""Асинхронные списки справочников для ASGI-воркеров.
+
+Данные отдаются из снимков справочников в памяти процесса, база
+нужна только при смене версии справочников. Ответ совпадает с ответом
+TagViewSet и IngredientViewSet. Подключаются в foodgram_backend.asgi_urls.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+
+from recipes.catalog import ingredient_index, tag_catalog
+from .caching import async_catalog_cache
+from .renderers import ORJSONRenderer
+
+ALLOWED_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def render(data, status_code=status.HTTP_200_OK):
+    response = HttpResponse(
+        ORJSONRenderer().render(data),
+        content_type='application/json',
+        status=status_code,
+    )
+    response['Allow'] = ', '.join(ALLOWED_METHODS)
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def method_not_allowed(request):
+    return render(
+        {'detail': f'Метод "{request.method}" не разрешен.'},
+        status_code=status.HTTP_405_METHOD_NOT_ALLOWED,
+    )
+
+
+@async_catalog_cache
+async def tag_list(request):
+    if request.method not in ALLOWED_METHODS:
+        return method_not_allowed(request)
+    return render(await sync_to_async(tag_catalog.items)())
+
+
+@async_catalog_cache
+async def ingredient_list(request):
+    if request.method not in ALLOWED_METHODS:
+        return method_not_allowed(request)
+    return render(await sync_to_async(ingredient_index.search)(
+        request.GET.get('name', '')
+    ))
+
+
+# csrf_exempt из Django 3.2 оборачивает вьюху в синхронную функцию.
+tag_list.csrf_exempt = ingredient_list.csrf_exempt = True
@@ -0,0 +1,83 @@
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from recipes.catalog import get_catalog_version
+from users import quantity as q
+
+
+def catalog_etag(request, *args, **kwargs):
+    representation = '{0}|{1}'.format(
+        request.get_full_path(), request.META.get('HTTP_ACCEPT', '')
+    )
+    return '{0}-{1}'.format(
+        get_catalog_version(),
+        hashlib.md5(representation.encode()).hexdigest(),
+    )
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    return datetime.fromtimestamp(
+        get_catalog_version() / 1e9, tz=timezone.utc
+    )
+
+
+def catalog_cache(view):
+    """ETag, Last-Modified и Cache-Control для справочников.
+
+    Версия справочников меняется при любом изменении тегов и ингредиентов,
+    поэтому 304 отдаётся до аутентификации и обращения к базе.
+    """
+    conditional_view = condition(
+        etag_func=catalog_etag,
+        last_modified_func=catalog_last_modified,
+    )(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = conditional_view(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            patch_cache_control(
+                response, public=True, max_age=q.CATALOG_CACHE_MAX_AGE
+            )
+        return response
+    return wrapper
+
+
+def catalog_validators(request):
+    return (
+        quote_etag(catalog_etag(request)),
+        int(catalog_last_modified(request).timestamp()),
+    )
+
+
+def async_catalog_cache(view):
+    """Аналог catalog_cache для асинхронных вьюх.
+
+    Версия справочников читается из кеша в потоке, чтобы не блокировать
+    цикл событий.
+    """
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        etag, last_modified = await sync_to_async(catalog_validators)(request)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = await view(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            response.headers.setdefault('ETag', etag)
+            response.headers.setdefault(
+                'Last-Modified', http_date(last_modified)
+            )
+            patch_cache_control(
+                response, public=True, max_age=q.CATALOG_CACHE_MAX_AGE
+            )
+        return response
+    return wrapper
@@ -0,0 +1,62 @@
+import gzip
+
+from django.utils.text import compress_sequence
+
+from users import quantity as q
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def gzip_compress(content):
+    return gzip.compress(content, compresslevel=q.GZIP_LEVEL, mtime=0)
+
+
+def brotli_compress(content):
+    return brotli.compress(content, quality=q.BROTLI_QUALITY)
+
+
+def brotli_sequence(sequence):
+    """Как compress_sequence, но brotli: сжатый блок на каждый кусок."""
+    compressor = brotli.Compressor(quality=q.BROTLI_QUALITY)
+    for item in sequence:
+        data = compressor.process(item) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+COMPRESSORS = {'gzip': (gzip_compress, compress_sequence)}
+if brotli is not None:
+    COMPRESSORS = {'br': (brotli_compress, brotli_sequence), **COMPRESSORS}
+
+
+def parse_accept_encoding(header):
+    """Кодировки из Accept-Encoding с их весами q."""
+    encodings = {}
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            encodings[coding.strip().lower()] = quality
+    return encodings
+
+
+def choose_encoding(header):
+    """Кодировка с наибольшим весом, при равенстве brotli."""
+    encodings = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for coding in COMPRESSORS:
+        quality = encodings.get(coding, encodings.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
@@ -0,0 +1,107 @@
+from collections import namedtuple
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+
+def split_param(value):
+    return tuple(dict.fromkeys(
+        item.strip() for item in value.split(',') if item.strip()
+    ))
+
+
+class Fieldset(namedtuple('Fieldset', 'fields expand', defaults=(None, None))):
+    """Запрошенные поля ответа, None — все поля и все вложенные объекты."""
+
+    @property
+    def sparse(self):
+        return self.fields is not None or self.expand is not None
+
+    def includes(self, name):
+        return (self.fields is None or name in self.fields
+                or name in (self.expand or ()))
+
+    def expands(self, name):
+        return not self.sparse or name in (self.expand or ())
+
+    def signature(self):
+        if not self.sparse:
+            return ''
+        return ':{0}:{1}'.format(
+            '*' if self.fields is None else ','.join(sorted(self.fields)),
+            ','.join(sorted(self.expand or ())),
+        )
+
+
+def get_fieldset(request, serializer_class):
+    """Разбирает ?profile=, ?fields= и ?expand= для сериализатора.
+
+    fields и expand уточняют профиль, неизвестные имена дают 400.
+    Результат запоминается на запросе.
+    """
+    if not hasattr(request, '_fieldsets'):
+        request._fieldsets = {}
+    if serializer_class in request._fieldsets:
+        return request._fieldsets[serializer_class]
+    params = request.query_params
+    profile = params.get('profile')
+    if profile is not None and profile not in serializer_class.profiles:
+        raise ValidationError({'profile': [f'Неизвестный профиль {profile}.']})
+    fields, expand = serializer_class.profiles.get(profile, (None, None))
+    if 'fields' in params:
+        fields = split_param(params['fields'])
+    if 'expand' in params:
+        expand = split_param(params['expand'])
+    errors = {}
+    unknown = set(fields or ()) - set(serializer_class().fields)
+    if unknown:
+        errors['fields'] = [f'Неизвестные поля: {", ".join(sorted(unknown))}.']
+    unknown = set(expand or ()) - set(serializer_class.expandable)
+    if unknown:
+        errors['expand'] = [
+            f'Нельзя развернуть поля: {", ".join(sorted(unknown))}.'
+        ]
+    if errors:
+        raise ValidationError(errors)
+    request._fieldsets[serializer_class] = Fieldset(fields, expand)
+    return request._fieldsets[serializer_class]
+
+
+class SparseFieldsMixin:
+    """Оставляет в ответе только поля из fields и expand.
+
+    Вложенные объекты из expandable, которые не просили развернуть,
+    заменяются свёрнутым полем, обычно первичным ключом. Без обоих
+    аргументов ответ полный.
+    """
+
+    expandable = {}
+    profiles = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fieldset = Fieldset(fields, expand)
+        if not self.fieldset.sparse:
+            return
+        for name in list(self.fields):
+            if not self.fieldset.includes(name):
+                self.fields.pop(name)
+            elif name in self.expandable and not self.fieldset.expands(name):
+                self.fields[name] = self.expandable[name]()
+
+
+class SparseFieldsViewMixin:
+    """Передаёт сериализатору поля из ?profile=, ?fields= и ?expand=."""
+
+    def get_fieldset(self, serializer_class=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        if (self.request.method not in SAFE_METHODS
+                or not issubclass(serializer_class, SparseFieldsMixin)):
+            return Fieldset()
+        return get_fieldset(self.request, serializer_class)
+
+    def get_serializer(self, *args, **kwargs):
+        fieldset = self.get_fieldset()
+        if fieldset.sparse:
+            kwargs.update(fieldset._asdict())
+        return super().get_serializer(*args, **kwargs)
@@ -1,19 +1,24 @@
-from rest_framework.filters import SearchFilter
 import django_filters
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, TrigramSimilarity
+)
+from django.db import connections
+from django.db.models import F, Q
 from django_filters.rest_framework import filters
 
-from recipes.models import Recipe, Tag
+from recipes.catalog import tag_catalog
+from recipes.models import Recipe
+from users import quantity as q
 
 
-class IngredientFilter(SearchFilter):
-    search_param = 'name'
+def tag_choices():
+    return [(tag['slug'], tag['name']) for tag in tag_catalog.items()]
 
 
 class RecipeFilter(django_filters.FilterSet):
-    tags = django_filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug',
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='get_tags',
     )
     is_favorited = filters.BooleanFilter(
         method="get_is_favorited",
@@ -21,10 +26,22 @@ class RecipeFilter(django_filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method="get_is_in_shopping_cart"
     )
+    search = filters.CharFilter(method='get_search')
 
     class Meta:
         model = Recipe
-        fields = ('is_favorited', 'is_in_shopping_cart', 'tags', 'author')
+        fields = (
+            'is_favorited', 'is_in_shopping_cart', 'tags', 'author', 'search'
+        )
+
+    def get_tags(self, queryset, name, value):
+        """Любой из тегов. На PostgreSQL — пересечение массивов по
+        GIN-индексу, без JOIN и DISTINCT, на других базах — через связь."""
+        ids_by_slug = tag_catalog.ids_by_slug()
+        tag_ids = [ids_by_slug[slug] for slug in value if slug in ids_by_slug]
+        if connections[queryset.db].vendor == 'postgresql':
+            return queryset.filter(tag_ids__overlap=tag_ids)
+        return queryset.filter(tags__in=tag_ids).distinct()
 
     def get_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
@@ -35,3 +52,16 @@ class RecipeFilter(django_filters.FilterSet):
         if self.request.user.is_authenticated and value:
             return queryset.filter(shopping__user=self.request.user)
         return queryset
+
+    def get_search(self, queryset, name, value):
+        query = SearchQuery(
+            value, config=q.SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.annotate(
+            search_rank=SearchRank(F('search_vector'), query),
+            search_similarity=TrigramSimilarity('name', value),
+        ).filter(
+            Q(search_vector=query) | Q(name__trigram_similar=value)
+        ).order_by(
+            '-search_rank', '-search_similarity', *Recipe._meta.ordering
+        )
@@ -0,0 +1,242 @@
+'''
+Management-команда для замера основных эндпоинтов API против бюджетов.
+'''
+
+import base64
+import json
+import statistics
+import time
+from collections import namedtuple
+from io import BytesIO
+from pathlib import Path
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import (CaptureQueriesContext, setup_test_environment,
+                               teardown_test_environment)
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.catalog import catalog_ids, ingredient_index, tag_catalog
+from recipes.models import Favorites, Ingredient, Recipe, Shopping, Tag
+from users.models import User
+
+BUDGETS_PATH = Path(__file__).resolve().parents[2] / 'benchmarks/budgets.json'
+
+Scenario = namedtuple(
+    'Scenario', 'name method url data prepare cold',
+    defaults=(None, None, False),
+)
+Result = namedtuple('Result', 'name status queries p50 p95 size')
+
+
+class Command(BaseCommand):
+    help = ('Замер числа запросов к базе, задержки и размера ответа '
+            'эндпоинтов на заполненной базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--user', help='Имя пользователя для запросов.')
+        parser.add_argument('--budgets', type=Path, default=BUDGETS_PATH)
+        parser.add_argument(
+            '--write-budgets', action='store_true',
+            help='Записать замеры в файл бюджетов вместо проверки.',
+        )
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        client = APIClient()
+        client.force_authenticate(user)
+        setup_test_environment()
+        try:
+            results = [
+                self.measure(client, scenario, options['repeat'])
+                for scenario in self.get_scenarios(user)
+            ]
+        finally:
+            teardown_test_environment()
+        if options['write_budgets']:
+            self.write_budgets(options['budgets'], results)
+            return
+        self.check_budgets(options['budgets'], results)
+
+    @staticmethod
+    def get_user(username):
+        users = User.objects.filter(recipes_count__gt=0)
+        if username:
+            users = User.objects.filter(username=username)
+        user = users.order_by('-recipes_count', 'id').first()
+        if user is None:
+            raise CommandError(
+                'Нет подходящего пользователя, запустите seed_benchmark.'
+            )
+        return user
+
+    def get_scenarios(self, user):
+        recipe = Recipe.objects.filter(author=user).first()
+        other = Recipe.objects.exclude(author=user).exclude(
+            favorites__user=user
+        ).exclude(shopping__user=user).first()
+        tags = list(Tag.objects.values_list('id', 'slug')[:2])
+        ingredient = Ingredient.objects.order_by('name').first()
+        if None in (recipe, other, ingredient) or not tags:
+            raise CommandError('База не заполнена, запустите seed_benchmark.')
+        payload = {
+            'name': 'Рецепт для замера',
+            'text': 'Описание рецепта для замера',
+            'cooking_time': 15,
+            'image': self.make_image(),
+            'tags': [tag_id for tag_id, _ in tags],
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 100}
+                for ingredient_id in Ingredient.objects.order_by(
+                    'id'
+                ).values_list('id', flat=True)[:6]
+            ],
+        }
+        scenarios = [
+            Scenario('recipes-list', 'get', '/api/recipes/'),
+            Scenario('recipes-list-cold', 'get', '/api/recipes/',
+                     cold=True),
+            Scenario('recipes-list-cursor', 'get',
+                     '/api/recipes/?pagination=cursor'),
+            Scenario('recipes-list-compact', 'get',
+                     '/api/recipes/?profile=compact'),
+            Scenario('recipes-list-tags', 'get', '/api/recipes/?' + '&'.join(
+                f'tags={slug}' for _, slug in tags
+            )),
+            Scenario('recipes-list-author', 'get',
+                     f'/api/recipes/?author={user.id}'),
+            Scenario('recipes-list-favorited', 'get',
+                     '/api/recipes/?is_favorited=1'),
+            Scenario('recipes-list-shopping-cart', 'get',
+                     '/api/recipes/?is_in_shopping_cart=1'),
+            Scenario('recipes-feed', 'get', '/api/recipes/feed/'),
+            Scenario('recipe-detail', 'get', f'/api/recipes/{recipe.id}/'),
+            Scenario('recipe-detail-cold', 'get',
+                     f'/api/recipes/{recipe.id}/', cold=True),
+            Scenario('subscriptions', 'get',
+                     '/api/users/subscriptions/?recipes_limit=3'),
+            Scenario('ingredients-search', 'get',
+                     f'/api/ingredients/?name={ingredient.name[:3]}'),
+            Scenario('download-shopping-cart', 'get',
+                     '/api/recipes/download_shopping_cart/'),
+            Scenario('favorite-add', 'post',
+                     f'/api/recipes/{other.id}/favorite/'),
+            Scenario('favorite-remove', 'delete',
+                     f'/api/recipes/{other.id}/favorite/',
+                     prepare=lambda: Favorites.objects.create(
+                         user=user, recipe=other
+                     )),
+            Scenario('shopping-cart-add', 'post',
+                     f'/api/recipes/{other.id}/shopping_cart/'),
+            Scenario('shopping-cart-remove', 'delete',
+                     f'/api/recipes/{other.id}/shopping_cart/',
+                     prepare=lambda: Shopping.objects.create(
+                         user=user, recipe=other
+                     )),
+            Scenario('recipe-create', 'post', '/api/recipes/', payload),
+            Scenario('recipe-update', 'patch', f'/api/recipes/{recipe.id}/',
+                     payload),
+        ]
+        if connection.vendor == 'postgresql':
+            scenarios.append(Scenario(
+                'recipes-list-search', 'get',
+                f'/api/recipes/?search={ingredient.name}'
+            ))
+        return scenarios
+
+    @staticmethod
+    def make_image():
+        buffer = BytesIO()
+        Image.new('RGB', (640, 480), (200, 120, 40)).save(buffer, 'PNG')
+        return 'data:image/png;base64,' + base64.b64encode(
+            buffer.getvalue()
+        ).decode()
+
+    @staticmethod
+    def measure(client, scenario, repeat):
+        """Первый запрос прогревает кеши и в замер не попадает.
+
+        Холодные сценарии перед каждым запросом сбрасывают кеш
+        представлений рецептов и снимки справочников, иначе N+1
+        в сериализаторах прячется за попаданиями в кеш.
+        """
+        timings = []
+        for _ in range(repeat + 1):
+            if scenario.cold:
+                caches['recipes'].clear()
+                for snapshot in (ingredient_index, tag_catalog, catalog_ids):
+                    snapshot.reset()
+            with transaction.atomic():
+                if scenario.prepare:
+                    scenario.prepare()
+                with CaptureQueriesContext(connection) as context:
+                    start = time.perf_counter()
+                    response = getattr(client, scenario.method)(
+                        scenario.url, scenario.data, format='json'
+                    )
+                    body = (b''.join(response.streaming_content)
+                            if response.streaming else response.content)
+                    timings.append((time.perf_counter() - start) * 1000)
+                transaction.set_rollback(True)
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{scenario.name}: {response.status_code} {body[:200]}'
+                )
+        timings = timings[1:]
+        p95 = (statistics.quantiles(timings, n=20)[-1]
+               if len(timings) > 1 else timings[0])
+        return Result(
+            scenario.name, response.status_code,
+            len(context.captured_queries), statistics.median(timings), p95,
+            len(body),
+        )
+
+    def write_budgets(self, path, results):
+        """Задержку записываем с тройным запасом, её разброс велик."""
+        budgets = {
+            result.name: {
+                'queries': result.queries,
+                'p95_ms': round(max(result.p95 * 3, 100)),
+                'bytes': round(result.size * 1.5),
+            }
+            for result in results
+        }
+        path.write_text(
+            json.dumps(budgets, indent=4, ensure_ascii=False) + '\n',
+            encoding='utf-8',
+        )
+        self.stdout.write(f'Бюджеты записаны в {path}')
+
+    def check_budgets(self, path, results):
+        budgets = json.loads(path.read_text(encoding='utf-8'))
+        failures = []
+        for result in results:
+            budget = budgets.get(result.name)
+            line = (
+                f'{result.name:28} {result.status} '
+                f'запросов {result.queries:3}, p50 {result.p50:7.1f} мс, '
+                f'p95 {result.p95:7.1f} мс, {result.size} байт'
+            )
+            if budget is None:
+                self.stdout.write(f'{line} — нет бюджета')
+                continue
+            exceeded = [
+                f'{label} {value} > {budget[key]}'
+                for key, label, value in (
+                    ('queries', 'запросов', result.queries),
+                    ('p95_ms', 'p95', round(result.p95, 1)),
+                    ('bytes', 'байт', result.size),
+                )
+                if value > budget[key]
+            ]
+            if exceeded:
+                failures.append(f'{result.name}: {", ".join(exceeded)}')
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+        if failures:
+            raise CommandError(
+                'Превышены бюджеты:\n' + '\n'.join(failures)
+            )
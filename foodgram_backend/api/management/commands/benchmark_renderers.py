@@ -0,0 +1,79 @@
+'''
+Management-команда для сравнения JSON-рендереров и сжатия ответов.
+'''
+
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.compression import COMPRESSORS
+from api.renderers import ORJSONRenderer
+from .benchmark_endpoints import Command as EndpointsCommand
+
+RENDERERS = {'json': JSONRenderer(), 'orjson': ORJSONRenderer()}
+
+
+def median_ms(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+class Command(BaseCommand):
+    help = ('Время сериализации ответа стандартным и orjson-рендерером '
+            'и размер ответа без сжатия, с gzip и brotli.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--user', help='Имя пользователя для запросов.')
+
+    def handle(self, *args, **options):
+        user = EndpointsCommand.get_user(options['user'])
+        client = APIClient()
+        client.force_authenticate(user)
+        scenarios = [
+            (scenario.name, scenario.url)
+            for scenario in EndpointsCommand().get_scenarios(user)
+            if scenario.method == 'get'
+            and scenario.name != 'download-shopping-cart'
+        ]
+        scenarios.append(('ingredients', '/api/ingredients/'))
+        setup_test_environment()
+        try:
+            for name, url in scenarios:
+                self.report(name, self.get_data(client, url), options)
+        finally:
+            teardown_test_environment()
+
+    @staticmethod
+    def get_data(client, url):
+        """Ответы асинхронных вьюх не содержат data, берём тело."""
+        response = client.get(url)
+        if hasattr(response, 'data'):
+            return response.data
+        return json.loads(response.content)
+
+    def report(self, name, data, options):
+        columns = []
+        for renderer, instance in RENDERERS.items():
+            elapsed = median_ms(
+                lambda: instance.render(data), options['repeat']
+            )
+            columns.append(f'{renderer} {elapsed:.2f} мс')
+        content = ORJSONRenderer().render(data)
+        columns.append(f'{len(content)} байт')
+        for encoding, (compress, _) in COMPRESSORS.items():
+            compressed = compress(content)
+            elapsed = median_ms(lambda: compress(content), options['repeat'])
+            columns.append(
+                f'{encoding} {len(compressed)} байт {elapsed:.2f} мс'
+            )
+        self.stdout.write(f'{name:28} ' + ', '.join(columns))
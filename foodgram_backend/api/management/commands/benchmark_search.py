@@ -0,0 +1,106 @@
+'''
+Management-команда для сравнения поиска рецептов с поиском через icontains.
+'''
+
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from api.filters import RecipeFilter
+from recipes.models import Ingredient, Recipe
+from users.models import User
+from users import quantity as q
+
+
+class Command(BaseCommand):
+    help = 'Замер поиска рецептов на таблице из большого числа рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--batch-size', type=int, default=5_000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Оставить созданные рецепты в базе. По умолчанию замер '
+                 'идёт в транзакции, которая откатывается.',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Поиск рецептов работает только в PostgreSQL.')
+        rng = random.Random(options['seed'])
+        words = list(Ingredient.objects.values_list('name', flat=True))
+        if not words:
+            raise CommandError('Сначала загрузите ингредиенты.')
+        with transaction.atomic():
+            self.measure(rng, words, options)
+            transaction.set_rollback(not options['keep'])
+
+    def measure(self, rng, words, options):
+        self.fill_recipes(rng, words, options['recipes'],
+                          options['batch_size'])
+        values = [rng.choice(words) for _ in range(options['repeat'])]
+        typos = [self.make_typo(rng, value) for value in values]
+        search = RecipeFilter().get_search
+        self.report('icontains', values, lambda value: Recipe.objects.filter(
+            Q(name__icontains=value) | Q(text__icontains=value)
+        ))
+        self.report('search', values,
+                    lambda value: search(Recipe.objects.all(), '', value))
+        self.report('search с опечаткой', typos,
+                    lambda value: search(Recipe.objects.all(), '', value))
+
+    def fill_recipes(self, rng, words, total, batch_size):
+        missing = total - Recipe.objects.count()
+        if missing <= 0:
+            return
+        author, _ = User.objects.get_or_create(
+            username='search_benchmark',
+            defaults={'email': 'search_benchmark@foodgram.local'},
+        )
+        start = time.perf_counter()
+        while missing > 0:
+            size = min(batch_size, missing)
+            Recipe.objects.bulk_create(
+                Recipe(
+                    author=author,
+                    name=' '.join(rng.sample(words, 3)),
+                    text=' '.join(rng.choices(words, k=30)),
+                    cooking_time=rng.randint(
+                        q.AMOUNT_MIN_VALUE, q.AMOUNT_MAX_VALUE // 100
+                    ),
+                )
+                for _ in range(size)
+            )
+            missing -= size
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Recipe._meta.db_table}')
+        self.stdout.write(
+            f'Рецептов в базе: {Recipe.objects.count()}, '
+            f'заполнение {time.perf_counter() - start:.1f} с'
+        )
+
+    @staticmethod
+    def make_typo(rng, value):
+        if len(value) < 4:
+            return value
+        position = rng.randrange(1, len(value) - 1)
+        return value[:position] + value[position + 1:]
+
+    def report(self, label, values, build_queryset):
+        timings = []
+        for value in values:
+            start = time.perf_counter()
+            list(build_queryset(value)[:q.PAGINATION_PAGE_SIZE])
+            timings.append((time.perf_counter() - start) * 1000)
+        p95 = (statistics.quantiles(timings, n=20)[-1]
+               if len(timings) > 1 else timings[0])
+        self.stdout.write(
+            f'{label}: p50 {statistics.median(timings):.1f} мс, '
+            f'p95 {p95:.1f} мс'
+        )
@@ -0,0 +1,149 @@
+'''
+Management-команда для сравнения WSGI и ASGI воркеров под нагрузкой.
+'''
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SERVERS = {
+    'wsgi': ('foodgram_backend.wsgi:application', 'sync'),
+    'asgi': ('foodgram_backend.asgi:application',
+             'uvicorn.workers.UvicornWorker'),
+}
+DEFAULT_PATHS = ('/api/tags/', '/api/ingredients/?name=%D1%81')
+
+Result = namedtuple('Result', 'server path rps p50 p95 errors rss')
+
+
+def read_rss(pid):
+    """RSS процесса и его потомков в килобайтах."""
+    total = 0
+    pids = [pid]
+    while pids:
+        current = pids.pop()
+        proc = Path('/proc') / str(current)
+        try:
+            status = (proc / 'status').read_text()
+            for task in (proc / 'task').iterdir():
+                pids.extend(map(int, (task / 'children').read_text().split()))
+        except OSError:
+            continue
+        for line in status.splitlines():
+            if line.startswith('VmRSS:'):
+                total += int(line.split()[1])
+    return total
+
+
+class Command(BaseCommand):
+    help = ('Сравнение пропускной способности, задержки и памяти gunicorn '
+            'с синхронными и uvicorn-воркерами на одинаковом числе воркеров.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--port', type=int, default=8100)
+        parser.add_argument(
+            '--server', choices=SERVERS, action='append',
+            help='Сервер для замера, по умолчанию оба.',
+        )
+        parser.add_argument(
+            '--path', action='append',
+            help='Путь для замера, можно указать несколько раз.',
+        )
+
+    def handle(self, *args, **options):
+        for server in options['server'] or SERVERS:
+            process = self.run_server(server, options)
+            try:
+                for path in options['path'] or DEFAULT_PATHS:
+                    self.report(self.measure(
+                        server, process.pid,
+                        f'http://127.0.0.1:{options["port"]}{path}', options,
+                    ))
+            finally:
+                process.terminate()
+                process.wait()
+
+    def run_server(self, server, options):
+        application, worker_class = SERVERS[server]
+        process = subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn', application,
+                '--worker-class', worker_class,
+                '--workers', str(options['workers']),
+                '--bind', f'127.0.0.1:{options["port"]}',
+            ],
+            cwd=settings.BASE_DIR,
+            env=os.environ.copy(),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            self.wait_ready(process, options['port'])
+        except CommandError:
+            process.terminate()
+            process.wait()
+            raise
+        return process
+
+    @staticmethod
+    def wait_ready(process, port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(
+                    f'Сервер завершился с кодом {process.returncode}.'
+                )
+            try:
+                urlopen(f'http://127.0.0.1:{port}/api/tags/', timeout=1)
+                return
+            except (URLError, OSError):
+                time.sleep(0.2)
+        raise CommandError('Сервер не запустился.')
+
+    @staticmethod
+    def fetch(url):
+        start = time.perf_counter()
+        try:
+            with urlopen(url, timeout=30) as response:
+                response.read()
+        except (URLError, OSError):
+            return None
+        return (time.perf_counter() - start) * 1000
+
+    def measure(self, server, pid, url, options):
+        """Первая волна запросов прогревает воркеры и в замер не попадает."""
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            list(pool.map(self.fetch, [url] * options['concurrency']))
+            start = time.perf_counter()
+            timings = list(pool.map(self.fetch, [url] * options['requests']))
+            elapsed = time.perf_counter() - start
+            rss = read_rss(pid)
+        succeeded = [timing for timing in timings if timing is not None]
+        if len(succeeded) < 2:
+            raise CommandError(f'{server} {url}: запросы не выполнены.')
+        return Result(
+            server, url.split('/', 3)[-1], len(succeeded) / elapsed,
+            statistics.median(succeeded),
+            statistics.quantiles(succeeded, n=20)[-1],
+            len(timings) - len(succeeded), rss,
+        )
+
+    def report(self, result):
+        self.stdout.write(
+            f'{result.server} /{result.path:30} {result.rps:8.1f} запр/с, '
+            f'p50 {result.p50:7.1f} мс, p95 {result.p95:7.1f} мс, '
+            f'ошибок {result.errors}, RSS {result.rss / 1024:.1f} МБ'
+        )
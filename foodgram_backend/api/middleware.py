@@ -0,0 +1,143 @@
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram_backend.db_router import (is_sticky, read_alias, replica_pool,
+                                        stick_to_primary)
+from users import quantity as q
+from .compression import COMPRESSORS, choose_encoding
+
+logger = logging.getLogger(__name__)
+
+
+class QueryTimer:
+    """Обёртка execute_wrapper: число запросов и время в базе."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class RequestTimingMiddleware(MiddlewareMixin):
+    """Server-Timing и строка лога для выборки запросов.
+
+    Доля запросов задаётся REQUEST_TIMING_SAMPLE_RATE, при нуле
+    middleware только передаёт запрос дальше. Запросы, выполненные
+    при отдаче StreamingHttpResponse, в подсчёт не попадают.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.sample_rate = settings.REQUEST_TIMING_SAMPLE_RATE
+
+    async def __acall__(self, request):
+        if not self.sample_rate:
+            return await self.get_response(request)
+        return await super().__acall__(request)
+
+    def process_request(self, request):
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return
+        timer = QueryTimer()
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        request._timing = (stack, timer, time.perf_counter())
+
+    def process_response(self, request, response):
+        if not hasattr(request, '_timing'):
+            return response
+        stack, timer, start = request._timing
+        stack.close()
+        total = (time.perf_counter() - start) * 1000
+        database = timer.duration * 1000
+        resolver_match = request.resolver_match
+        view = resolver_match.url_name if resolver_match else None
+        response['Server-Timing'] = (
+            f'db;dur={database:.1f};desc="{timer.count} queries", '
+            f'app;dur={total - database:.1f}, total;dur={total:.1f}'
+        )
+        logger.info(
+            'view=%s method=%s status=%s queries=%d db_ms=%.1f total_ms=%.1f',
+            view or '-', request.method, response.status_code, timer.count,
+            database, total,
+        )
+        return response
+
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """Безопасные запросы читают с реплики, остальные работают с основной
+    базой и на время задержки реплик закрепляют за ней клиента."""
+
+    async def __acall__(self, request):
+        if not replica_pool.aliases:
+            return await self.get_response(request)
+        return await super().__acall__(request)
+
+    def __call__(self, request):
+        if not replica_pool.aliases:
+            return self.get_response(request)
+        return super().__call__(request)
+
+    def process_request(self, request):
+        if request.method in SAFE_METHODS and not is_sticky(request):
+            read_alias.set(replica_pool.choose())
+
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS:
+            stick_to_primary(request, response)
+        read_alias.set(None)
+        return response
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Сжатие ответа brotli или gzip по Accept-Encoding.
+
+    brotli доступен, если установлен пакет brotli. Ответы короче
+    COMPRESSION_MIN_SIZE байт отдаются как есть.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        if (not response.streaming
+                and len(response.content) < q.COMPRESSION_MIN_SIZE):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        if encoding is None:
+            return response
+        compress, compress_sequence = COMPRESSORS[encoding]
+        if response.streaming:
+            response.streaming_content = compress_sequence(
+                response.streaming_content
+            )
+            del response.headers['Content-Length']
+        else:
+            content = compress(response.content)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers['Content-Length'] = str(len(content))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
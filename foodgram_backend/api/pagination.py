@@ -1,4 +1,10 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import (
+    CursorPagination, PageNumberPagination, _reverse_ordering
+)
 
 from users import quantity as q
 
@@ -6,3 +12,122 @@ from users import quantity as q
 class LimitedPagePagination(PageNumberPagination):
     page_size = q.PAGINATION_PAGE_SIZE
     page_size_query_param = "recipes_limit"
+
+
+class PageLimitPagination(PageNumberPagination):
+    page_size = q.PAGINATION_PAGE_SIZE
+    page_size_query_param = 'limit'
+
+
+class FeedCursorPagination(CursorPagination):
+    """Курсорная пагинация без COUNT(*) и OFFSET для глубоких страниц.
+
+    Позиция курсора — значения всех полей сортировки последнего объекта
+    страницы, следующая страница начинается строго после них. Последнее
+    поле сортировки должно быть уникальным.
+    """
+
+    page_size = q.PAGINATION_PAGE_SIZE
+    page_size_query_params = ('limit', 'recipes_limit')
+    ordering = ('-pub_date', '-id')
+    # Параметры со своей сортировкой, курсор её бы подменил.
+    ordered_query_params = ('search',)
+
+    def get_page_size(self, request):
+        for param in self.page_size_query_params:
+            try:
+                page_size = int(request.query_params[param])
+            except (KeyError, ValueError):
+                continue
+            if page_size > 0:
+                return page_size
+        return self.page_size
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'cursor_ordering', self.ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        conflicting = [
+            param for param in self.ordered_query_params
+            if param in request.query_params
+        ]
+        if conflicting:
+            raise ValidationError({self.cursor_query_param: [
+                'Курсорная пагинация несовместима с параметрами: '
+                f'{", ".join(conflicting)}.'
+            ]})
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is not None:
+            self.cursor = self.cursor._replace(offset=0)
+        reverse, position = (
+            (False, None) if self.cursor is None else self.cursor[1:]
+        )
+        ordering = _reverse_ordering(self.ordering) if reverse else (
+            self.ordering
+        )
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = None
+        if len(results) > len(self.page):
+            following = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        if reverse:
+            self.page.reverse()
+            self.next_position, self.previous_position = position, following
+        else:
+            self.next_position, self.previous_position = following, position
+        self.has_next = self.next_position is not None
+        self.has_previous = self.previous_position is not None
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def after(self, ordering, position):
+        """Условие «строго после позиции» для составного ключа."""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        condition = Q()
+        equal = Q()
+        for order, value in zip(ordering, values):
+            field = order.lstrip('-')
+            lookup = 'lt' if order.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        return json.dumps([
+            str(getattr(instance, order.lstrip('-'))) for order in ordering
+        ])
+
+
+class CursorPaginationMixin:
+    """Включает курсорную пагинацию по ?pagination=cursor или ?cursor=."""
+
+    cursor_pagination_class = FeedCursorPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params if self.request else {}
+            if (params.get('pagination') == 'cursor'
+                    or self.cursor_pagination_class.cursor_query_param
+                    in params):
+                self._paginator = self.cursor_pagination_class()
+                return self._paginator
+        return super().paginator
+
+
+class TimelineCursorPagination(FeedCursorPagination):
+    ordering = ('-feed_date', '-id')
@@ -0,0 +1,106 @@
+import csv
+import json
+
+import orjson
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+from users import quantity as q
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer на orjson с тем же результатом.
+
+    Даты, Decimal, ленивые строки и прочие типы вне JSON приводятся
+    кодировщиком DRF. С отступами, как в Browsable API, работает
+    стандартный рендерер. Отличается только запись чисел с плавающей
+    точкой в экспоненциальной форме: 1e16 вместо 1e+16.
+    """
+
+    default = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(
+            data, default=self.default, option=ORJSON_OPTIONS
+        ).replace(
+            '\u2028'.encode(), b'\\u2028'
+        ).replace('\u2029'.encode(), b'\\u2029')
+
+
+class CSVRowBuffer:
+    """Буфер, который отдаёт строку, записанную csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListRendererMixin:
+    """Построчная выгрузка списка покупок для StreamingHttpResponse."""
+
+    def lines(self, ingredients):
+        raise NotImplementedError
+
+    def stream(self, ingredients):
+        chunk = []
+        for line in self.lines(ingredients):
+            chunk.append(line)
+            if len(chunk) >= q.SHOPPING_LIST_CHUNK_SIZE:
+                yield ''.join(chunk)
+                chunk = []
+        if chunk:
+            yield ''.join(chunk)
+
+
+class ShoppingListTextRenderer(ShoppingListRendererMixin,
+                               renderers.BaseRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return ''.join(self.stream(data)).encode(self.charset)
+
+    def lines(self, ingredients):
+        for ingredient in ingredients:
+            yield (f"{ingredient['ingredient__name']} - "
+                   f"{ingredient['total_amount']} "
+                   f"{ingredient['ingredient__measurement_unit']};\n")
+
+
+class ShoppingListCSVRenderer(ShoppingListTextRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def lines(self, ingredients):
+        writer = csv.writer(CSVRowBuffer())
+        yield writer.writerow(
+            ('Ингредиент', 'Единица измерения', 'Количество')
+        )
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient['ingredient__name'],
+                ingredient['ingredient__measurement_unit'],
+                ingredient['total_amount'],
+            ))
+
+
+class ShoppingListJSONRenderer(ShoppingListRendererMixin,
+                               renderers.JSONRenderer):
+    charset = 'utf-8'
+
+    def lines(self, ingredients):
+        separator = '['
+        for ingredient in ingredients:
+            yield separator + json.dumps({
+                'name': ingredient['ingredient__name'],
+                'measurement_unit': ingredient['ingredient__measurement_unit'],
+                'amount': ingredient['total_amount'],
+            }, ensure_ascii=False, separators=(',', ':'))
+            separator = ','
+        yield '[]' if separator == '[' else ']'
@@ -1,17 +1,42 @@
+import hashlib
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Manager, Prefetch, prefetch_related_objects
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
+from recipes.catalog import catalog_ids, get_catalog_version
 from recipes.models import (RecipeIngredient,
                             Tag,
                             Ingredient,
                             Recipe,
                             Favorites,
                             Shopping, Subscribe)
+from recipes.renditions import rendition_urls
 from users.models import User
 from users import quantity as q
+from .fieldsets import Fieldset, SparseFieldsMixin
+
+COMPACT_RECIPE_FIELDS = (
+    'id', 'name', 'image', 'cooking_time', 'tags',
+    'is_favorited', 'is_in_shopping_cart',
+)
+
+
+def get_subscribed_author_ids(request):
+    """Id авторов, на которых подписан пользователь, один запрос на запрос."""
+    if not hasattr(request, '_subscribed_author_ids'):
+        user = request.user
+        request._subscribed_author_ids = (
+            set(user.subscriber.values_list('author_id', flat=True))
+            if user.is_authenticated else set()
+        )
+    return request._subscribed_author_ids
 
 
-class UserGetSerializer(serializers.ModelSerializer):
+class UserGetSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -25,11 +50,7 @@ class UserGetSerializer(serializers.ModelSerializer):
         read_only_filelds = ('is_subscribed',)
 
     def get_is_subscribed(self, author):
-        user = self.context['request'].user
-        return (
-            user.is_authenticated and user.subscriber.filter(
-                author=author
-            ).exists())
+        return author.id in get_subscribed_author_ids(self.context['request'])
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -66,7 +87,37 @@ class RecipeIngredientsSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
+class RecipeIngredientAmountSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='ingredient_id', read_only=True)
+
+    class Meta:
+        model = RecipeIngredient
+        fields = ('id', 'amount')
+
+
+def recipe_cache_keys(recipes, request, fieldset=Fieldset()):
+    """Ключи представлений: версия рецепта и справочников, хост и набор
+    полей. Хост и поля хешируются, чтобы ключ подходил memcached."""
+    version = get_catalog_version()
+    variant = hashlib.md5(
+        (request.build_absolute_uri('/') + fieldset.signature()).encode()
+    ).hexdigest()
+    return {
+        recipe.id: 'recipe:{0}:{1}:{2}:{3}'.format(
+            recipe.id, recipe.updated_at.timestamp(), version, variant
+        )
+        for recipe in recipes
+    }
+
+
+class RecipeCachedListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, Manager) else data
+        return self.child.represent_many(list(recipes))
+
+
+class RecipeListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     author = UserGetSerializer(read_only=True)
     ingredients = RecipeIngredientsSerializer(
@@ -86,10 +137,82 @@ class RecipeListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = ('__all__')
+        exclude = (
+            'favorites_count', 'shopping_count', 'search_vector', 'updated_at',
+            'tag_ids',
+        )
         read_only_fields = ('id', 'author',)
+        list_serializer_class = RecipeCachedListSerializer
+
+    expandable = {
+        'author': lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+        'tags': lambda: serializers.PrimaryKeyRelatedField(
+            many=True, read_only=True
+        ),
+        'ingredients': lambda: RecipeIngredientAmountSerializer(
+            many=True, source='ingredient'
+        ),
+    }
+    profiles = {'compact': (COMPACT_RECIPE_FIELDS, ('tags',))}
+
+    def get_prefetch(self):
+        """Подгружаем только связи, которые попадут в ответ."""
+        fieldset = self.fieldset
+        lookups = []
+        if fieldset.includes('author') and fieldset.expands('author'):
+            lookups.append('author')
+        if fieldset.includes('tags'):
+            lookups.append(Prefetch('tags', queryset=Tag.objects.all()))
+        if fieldset.includes('ingredients'):
+            queryset = RecipeIngredient.objects.all()
+            if fieldset.expands('ingredients'):
+                queryset = queryset.select_related('ingredient')
+            lookups.append(Prefetch('ingredient', queryset=queryset))
+        return lookups
+
+    def to_representation(self, recipe):
+        return self.represent_many([recipe])[0]
+
+    def represent_many(self, recipes):
+        """Общая для всех часть берётся из кеша, флаги зрителя — из
+        аннотаций запроса и одного набора id подписок."""
+        request = self.context['request']
+        keys = recipe_cache_keys(recipes, request, self.fieldset)
+        cache = caches['recipes']
+        shared = cache.get_many(keys.values())
+        missing = [
+            recipe for recipe in recipes if keys[recipe.id] not in shared
+        ]
+        if missing:
+            prefetch_related_objects(missing, *self.get_prefetch())
+            built = {
+                keys[recipe.id]: super(
+                    RecipeListSerializer, self
+                ).to_representation(recipe)
+                for recipe in missing
+            }
+            cache.set_many(built, timeout=q.RECIPE_CACHE_TIMEOUT)
+            shared.update(built)
+        representations = []
+        for recipe in recipes:
+            data = shared[keys[recipe.id]].copy()
+            if isinstance(data.get('author'), dict):
+                data['author'] = data['author'].copy()
+                data['author']['is_subscribed'] = (
+                    recipe.author_id in get_subscribed_author_ids(request)
+                )
+            if 'is_favorited' in data:
+                data['is_favorited'] = self.get_is_favorited(recipe)
+            if 'is_in_shopping_cart' in data:
+                data['is_in_shopping_cart'] = (
+                    self.get_is_in_shopping_cart(recipe)
+                )
+            representations.append(data)
+        return representations
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context['request']
         return (request.user.is_authenticated
                 and obj.favorites.filter(
@@ -97,6 +220,8 @@ class RecipeListSerializer(serializers.ModelSerializer):
                 ).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context['request']
         return (request.user.is_authenticated
                 and obj.shopping.filter(
@@ -123,6 +248,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     author = UserGetSerializer(read_only=True)
     image = Base64ImageField(allow_empty_file=False, allow_null=False)
     ingredients = CreateIngredientSerializer(many=True)
+    tags = serializers.ListField(child=serializers.IntegerField())
 
     class Meta:
         model = Recipe
@@ -138,20 +264,41 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         )
 
     def validate(self, data):
-        ingredients = self.initial_data.get('ingredients')
+        ingredients = data.get('ingredients')
         if not ingredients:
             raise serializers.ValidationError('Ингредиент не выбран')
-        ingredients_list = [ingredient['id'] for ingredient in ingredients]
-        if len(ingredients_list) != len(set(ingredients_list)):
-            raise serializers.ValidationError(
-                'Проверьте, какой-то ингредиент был выбран более 1 раза'
-            )
-        tag_ids = self.initial_data.get('tags')
+        tag_ids = data.get('tags')
         if not tag_ids:
             raise serializers.ValidationError('Теги отсутствуют')
-        tags = Tag.objects.filter(id__in=tag_ids)
-        if len(tags) != len(tags):
-            raise serializers.ValidationError('Указан несуществующий тег')
+        ingredient_ids = [ingredient['id'] for ingredient in ingredients]
+        missing_ingredients, missing_tags = catalog_ids.missing(
+            ingredient_ids, tag_ids
+        )
+        ingredient_errors, seen = [], set()
+        for ingredient_id in ingredient_ids:
+            if ingredient_id in missing_ingredients:
+                ingredient_errors.append({'id': [
+                    f'Ингредиента с id {ingredient_id} не существует.'
+                ]})
+            elif ingredient_id in seen:
+                ingredient_errors.append({'id': [
+                    'Этот ингредиент уже выбран.'
+                ]})
+            else:
+                ingredient_errors.append({})
+            seen.add(ingredient_id)
+        tag_errors = {
+            index: [f'Тега с id {tag_id} не существует.']
+            for index, tag_id in enumerate(tag_ids)
+            if tag_id in missing_tags
+        }
+        errors = {}
+        if any(ingredient_errors):
+            errors['ingredients'] = ingredient_errors
+        if tag_errors:
+            errors['tags'] = tag_errors
+        if errors:
+            raise serializers.ValidationError(errors)
         return data
 
     def create_ingredients(self, recipe, ingredients):
@@ -165,20 +312,53 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         ]
         RecipeIngredient.objects.bulk_create(create_ingredients)
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         author = self.context['request'].user
-        recipe = Recipe.objects.create(author=author, **validated_data)
+        recipe = Recipe.objects.create(
+            author=author, tag_ids=sorted(set(tags)), **validated_data
+        )
         recipe.tags.set(tags)
         self.create_ingredients(recipe, ingredients_data)
         return recipe
 
+    def update_ingredients(self, recipe, ingredients):
+        """Пишем только добавленные, изменённые и удалённые строки."""
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        existing = {
+            row.ingredient_id: row
+            for row in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        removed = [
+            row.id for ingredient_id, row in existing.items()
+            if ingredient_id not in amounts
+        ]
+        if removed:
+            RecipeIngredient.objects.filter(id__in=removed).delete()
+        changed = []
+        for ingredient_id, row in existing.items():
+            amount = amounts.get(ingredient_id, row.amount)
+            if amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        self.create_ingredients(recipe, [
+            ingredient for ingredient in ingredients
+            if ingredient['id'] not in existing
+        ])
+
+    @transaction.atomic
     def update(self, recipe, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        RecipeIngredient.objects.filter(recipe=recipe).delete()
-        self.create_ingredients(recipe, ingredients_data)
+        self.update_ingredients(recipe, ingredients_data)
+        recipe.tag_ids = sorted(set(tags))
         recipe.tags.set(tags)
         return super().update(recipe, validated_data)
 
@@ -189,14 +369,24 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
 
 class SubscribeRecipeSerializer(serializers.ModelSerializer):
+    image_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'cooking_time', 'image_renditions')
+
+    def get_image_renditions(self, recipe):
+        return rendition_urls(recipe.image, self.context.get('request'))
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
-    """Сериализатор для осуществления подписки."""
+    """Ответ на подписку; саму связь создаёт recipes.toggles."""
+
+    duplicate_error = {
+        api_settings.NON_FIELD_ERRORS_KEY: [
+            'Вы уже подписаны на этого пользователя.'
+        ],
+    }
 
     class Meta:
         model = Subscribe
@@ -207,29 +397,21 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         return SubscribeSerializer(instance.author,
                                    context={'request': request}).data
 
-    def validate(self, data):
-        if data['author'] == data['user']:
-            raise serializers.ValidationError(
-                'Вы не можете подписаться на себя.'
-            )
-        if Subscribe.objects.filter(author=data['author'],
-                                    user=data['user']).exists():
-            raise serializers.ValidationError(
-                'Вы уже подписаны на этого пользователя.'
-            )
-        return data
-
 
 class SubscribeSerializer(UserGetSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
-        exclude = ('password',)
+        exclude = ('password', 'followers_count')
         read_only_fields = ('recipes_count',)
 
     def get_recipes(self, author):
+        if hasattr(author, 'limited_recipes'):
+            return SubscribeRecipeSerializer(
+                author.limited_recipes, many=True
+            ).data
         request = self.context.get('request')
         limit = request.query_params.get(
             'recipes_limit')
@@ -241,30 +423,28 @@ class SubscribeSerializer(UserGetSerializer):
                 pass
         return SubscribeRecipeSerializer(recipes, many=True).data
 
-    def get_recipes_count(self, author):
-        return author.recipes.count()
 
+class ShoppingCartRecipeSerializer(SubscribeRecipeSerializer):
 
-class ShoppingCartRecipeSerializer(serializers.ModelSerializer):
+    class Meta(SubscribeRecipeSerializer.Meta):
+        pass
 
-    class Meta:
-        model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=q.BULK_RECIPES_MAX_COUNT,
+    )
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
+    duplicate_error = {'warning_message': ['Вы уже добавили этот рецепт.']}
+
     class Meta:
         model = Favorites
         fields = ('user', 'recipe')
 
-    def validate(self, data):
-        user, recipe = data.get('user'), data.get('recipe')
-        if self.Meta.model.objects.filter(user=user, recipe=recipe).exists():
-            raise serializers.ValidationError(
-                {'warning_message': 'Вы уже добавили этот рецепт.'}
-            )
-        return data
-
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
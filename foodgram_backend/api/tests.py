@@ -0,0 +1,881 @@
+import base64
+import csv
+import gzip
+import json
+from datetime import date, datetime
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+import brotli
+from asgiref.sync import sync_to_async
+from django.core.cache import cache, caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (AsyncClient, RequestFactory, SimpleTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from api.async_views import ingredient_list, tag_list
+from api.compression import choose_encoding
+from api.middleware import CompressionMiddleware, ReplicaRoutingMiddleware
+from api.parsers import ORJSONParser
+from api.renderers import ORJSONRenderer
+from api.fieldsets import Fieldset
+from api.serializers import (COMPACT_RECIPE_FIELDS, RecipeCreateSerializer,
+                             recipe_cache_keys)
+from api.views import RecipeViewset
+from foodgram_backend.db_router import ReplicaRouter, read_alias, replica_pool
+from recipes.catalog import catalog_ids, get_catalog_version
+from recipes.models import (
+    Favorites, Ingredient, Recipe, RecipeIngredient, Shopping, Subscribe,
+    Tag, TimelineJob
+)
+from users import quantity as q
+from users.models import User
+
+ASGI_URLCONF = 'foodgram_backend.asgi_urls'
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'recipes': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'recipes',
+    },
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class FoodgramTestCase(APITestCase):
+    """Авторы с рецептами, теги и ингредиенты для тестов API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com',
+            first_name='Читатель', last_name='Тестовый',
+        )
+        cls.authors = [
+            User.objects.create(
+                username=f'author{index}',
+                email=f'author{index}@example.com',
+                first_name='Автор', last_name=str(index),
+            )
+            for index in range(3)
+        ]
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {index}', slug=f'tag{index}',
+                color=f'#00000{index}',
+            )
+            for index in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {index}', measurement_unit='г'
+            )
+            for index in range(6)
+        ]
+        cls.recipes = []
+        for index in range(9):
+            recipe = Recipe.objects.create(
+                author=cls.authors[index % len(cls.authors)],
+                name=f'Рецепт {index}', text='Текст', cooking_time=5,
+            )
+            recipe.tags.set(cls.tags[:1 + index % len(cls.tags)])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, amount=amount,
+                    ingredient=cls.ingredients[(index + amount) % 6],
+                )
+                for amount in range(1, 4)
+            )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+        self.client.force_authenticate(self.user)
+
+    def get_ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return sorted(recipe['id'] for recipe in response.json()['results'])
+
+
+class RecipeIngredientUpdateTests(FoodgramTestCase):
+    """Обновление рецепта пишет только изменившиеся строки состава."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.recipes[0]
+        self.rows = {
+            row.ingredient_id: row
+            for row in RecipeIngredient.objects.filter(recipe=self.recipe)
+        }
+
+    def update(self, amounts, queries):
+        with self.assertNumQueries(queries):
+            RecipeCreateSerializer().update_ingredients(self.recipe, [
+                {'id': ingredient_id, 'amount': amount}
+                for ingredient_id, amount in amounts.items()
+            ])
+        rows = {
+            row.ingredient_id: row
+            for row in RecipeIngredient.objects.filter(recipe=self.recipe)
+        }
+        self.assertEqual(
+            {ingredient_id: row.amount for ingredient_id, row in rows.items()},
+            amounts,
+        )
+        return {
+            ingredient_id for ingredient_id, row in rows.items()
+            if ingredient_id not in self.rows
+            or self.rows[ingredient_id].id != row.id
+        }
+
+    def test_unchanged(self):
+        created = self.update({
+            ingredient_id: row.amount
+            for ingredient_id, row in self.rows.items()
+        }, queries=1)
+        self.assertEqual(created, set())
+
+    def test_partially_changed(self):
+        kept, changed, removed = self.rows
+        added = next(
+            ingredient.id for ingredient in self.ingredients
+            if ingredient.id not in self.rows
+        )
+        created = self.update({
+            kept: self.rows[kept].amount,
+            changed: self.rows[changed].amount + 10,
+            added: 7,
+        }, queries=4)
+        self.assertEqual(created, {added})
+        self.assertFalse(RecipeIngredient.objects.filter(
+            id=self.rows[removed].id
+        ).exists())
+
+    def test_fully_replaced(self):
+        amounts = {
+            ingredient.id: 5 for ingredient in self.ingredients
+            if ingredient.id not in self.rows
+        }
+        created = self.update(amounts, queries=3)
+        self.assertEqual(created, set(amounts))
+
+
+class RecipeCreateTests(FoodgramTestCase):
+
+    def payload(self):
+        buffer = BytesIO()
+        Image.new('RGB', (8, 8)).save(buffer, 'PNG')
+        return {
+            'name': 'Новый рецепт', 'text': 'Текст', 'cooking_time': 10,
+            'image': 'data:image/png;base64,' + base64.b64encode(
+                buffer.getvalue()
+            ).decode(),
+            'tags': [self.tags[0].id],
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 5}],
+        }
+
+    def test_failed_ingredients_leave_no_recipe(self):
+        recipes = Recipe.objects.count()
+        jobs = TimelineJob.objects.count()
+        with mock.patch.object(
+            RecipeIngredient.objects, 'bulk_create', side_effect=DatabaseError
+        ), self.assertRaises(DatabaseError):
+            self.client.post('/api/recipes/', self.payload(), format='json')
+        self.assertEqual(Recipe.objects.count(), recipes)
+        self.assertEqual(TimelineJob.objects.count(), jobs)
+
+    def test_per_item_errors(self):
+        payload = self.payload()
+        known = self.ingredients[0].id
+        unknown = Ingredient.objects.order_by('-id').first().id + 100
+        payload['ingredients'] = [
+            {'id': known, 'amount': 5},
+            {'id': unknown, 'amount': 5},
+            {'id': known, 'amount': 7},
+        ]
+        payload['tags'] = [self.tags[0].id, self.tags[-1].id + 100]
+        response = self.client.post('/api/recipes/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {
+            'ingredients': [
+                {},
+                {'id': [f'Ингредиента с id {unknown} не существует.']},
+                {'id': ['Этот ингредиент уже выбран.']},
+            ],
+            'tags': {
+                '1': [f'Тега с id {self.tags[-1].id + 100} не существует.'],
+            },
+        })
+
+    def test_ids_added_before_version_bump(self):
+        catalog_ids.missing([], [])
+        # bulk_create не шлёт сигналов: так выглядит запись другого
+        # процесса, который ещё не сменил версию справочников.
+        Ingredient.objects.bulk_create([
+            Ingredient(name='Новый', measurement_unit='г')
+        ])
+        Tag.objects.bulk_create([
+            Tag(name='Новый', slug='new', color='#123456')
+        ])
+        added = Ingredient.objects.get(name='Новый')
+        tag = Tag.objects.get(slug='new')
+        with self.assertNumQueries(1):
+            missing = catalog_ids.missing(
+                [added.id, added.id + 100], [tag.id]
+            )
+        self.assertEqual(missing, ({added.id + 100}, set()))
+        response = self.client.post('/api/recipes/', {
+            **self.payload(),
+            'ingredients': [{'id': added.id, 'amount': 5}],
+            'tags': [tag.id],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+
+class RecipeCursorTests(FoodgramTestCase):
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            ids.extend(recipe['id'] for recipe in data['results'])
+            url = data['next']
+        return ids, data['previous']
+
+    def test_pages_by_composite_key(self):
+        Recipe.objects.update(pub_date=timezone.now())
+        expected = list(Recipe.objects.order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True))
+        ids, previous = self.walk('/api/recipes/?pagination=cursor&limit=2')
+        self.assertEqual(ids, expected)
+        response = self.client.get(previous)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['results']],
+            expected[-3:-1],
+        )
+
+    def test_cursor_with_search(self):
+        response = self.client.get(
+            '/api/recipes/?pagination=cursor&search=суп'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/?cursor=cD1nYXJiYWdl')
+        self.assertEqual(response.status_code, 404)
+
+
+class RecipePaginationTests(FoodgramTestCase):
+    """Список рецептов делится на страницы, размер задаёт ?limit=."""
+
+    def test_default_page(self):
+        data = self.client.get('/api/recipes/').json()
+        self.assertEqual(
+            set(data), {'count', 'next', 'previous', 'results'})
+        self.assertEqual(data['count'], 9)
+        self.assertEqual(len(data['results']), 6)
+        self.assertIsNone(data['previous'])
+        self.assertIn('page=2', data['next'])
+
+    def test_limit(self):
+        data = self.client.get('/api/recipes/?limit=2').json()
+        self.assertEqual(data['count'], 9)
+        self.assertEqual(len(data['results']), 2)
+        self.assertIn('limit=2', data['next'])
+        self.assertIn('page=2', data['next'])
+
+    def test_limit_last_page(self):
+        first = self.client.get('/api/recipes/?limit=4').json()
+        second = self.client.get('/api/recipes/?limit=4&page=3').json()
+        self.assertEqual(len(second['results']), 1)
+        self.assertIsNone(second['next'])
+        self.assertIn('limit=4', second['previous'])
+        self.assertFalse(
+            {item['id'] for item in first['results']}
+            & {item['id'] for item in second['results']})
+
+
+class RecipeTagFilterTests(FoodgramTestCase):
+
+    def expected_ids(self, *tags):
+        return sorted(Recipe.objects.filter(
+            tags__in=tags
+        ).distinct().values_list('id', flat=True))
+
+    def test_tag_ids_follow_tags(self):
+        for recipe in self.recipes:
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.tag_ids, sorted(
+                recipe.tags.values_list('id', flat=True)
+            ))
+
+    def test_filter_by_one_tag(self):
+        self.assertEqual(
+            self.get_ids('/api/recipes/?limit=100&tags=tag2'),
+            self.expected_ids(self.tags[2]),
+        )
+
+    def test_filter_by_any_of_tags(self):
+        self.assertEqual(
+            self.get_ids('/api/recipes/?limit=100&tags=tag1&tags=tag2'),
+            self.expected_ids(self.tags[1], self.tags[2]),
+        )
+
+    def test_filter_follows_tag_changes(self):
+        recipe = self.recipes[0]
+        recipe.tags.set([self.tags[2]])
+        self.assertIn(recipe.id, self.get_ids('/api/recipes/?tags=tag2'))
+        self.tags[2].recipes.clear()
+        self.assertEqual(self.get_ids('/api/recipes/?tags=tag2'), [])
+
+    def test_deleted_tag_leaves_recipes(self):
+        tag_id = self.tags[0].id
+        self.tags[0].delete()
+        for recipe in Recipe.objects.all():
+            self.assertNotIn(tag_id, recipe.tag_ids)
+
+    def test_unknown_tag(self):
+        response = self.client.get('/api/recipes/?tags=missing')
+        self.assertEqual(response.status_code, 400)
+
+
+class RecipeListQueryTests(FoodgramTestCase):
+    """Число запросов списка рецептов не зависит от числа рецептов."""
+
+    def setUp(self):
+        super().setUp()
+        get_catalog_version()
+
+    def test_queries_do_not_grow_with_page(self):
+        for page, size in ((1, 6), (2, 3)):
+            with self.subTest(page=page):
+                caches['recipes'].clear()
+                with self.assertNumQueries(6):
+                    response = self.client.get(f'/api/recipes/?page={page}')
+                self.assertEqual(len(response.json()['results']), size)
+
+    def test_cached_representations(self):
+        self.client.get('/api/recipes/')
+        with self.assertNumQueries(3):
+            self.client.get('/api/recipes/')
+
+
+class SubscriptionsTests(FoodgramTestCase):
+
+    def test_recipes_limit_without_subscriptions(self):
+        response = self.client.get('/api/users/subscriptions/?recipes_limit=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+
+    def test_recipes_limit(self):
+        for author in self.authors:
+            Subscribe.objects.create(user=self.user, author=author)
+        response = self.client.get('/api/users/subscriptions/?recipes_limit=2')
+        self.assertEqual(response.status_code, 200)
+        for author in response.json()['results']:
+            expected = list(Recipe.objects.filter(
+                author_id=author['id']
+            ).order_by('-pub_date', '-id').values_list('id', flat=True)[:2])
+            self.assertEqual(
+                [recipe['id'] for recipe in author['recipes']], expected
+            )
+
+
+class ToggleTests(FoodgramTestCase):
+    """Добавление и удаление избранного и подписок."""
+
+    def toggle(self, method, url, expected_status):
+        response = getattr(self.client, method)(url)
+        self.assertEqual(response.status_code, expected_status)
+        return response
+
+    def test_favorite(self):
+        recipe = self.recipes[0]
+        url = f'/api/recipes/{recipe.id}/favorite/'
+        response = self.toggle('post', url, 201)
+        self.assertEqual(response.json()['id'], recipe.id)
+        self.toggle('post', url, 400)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        self.toggle('delete', url, 204)
+        self.toggle('delete', url, 400)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+
+    def test_missing_recipe(self):
+        for method in ('post', 'delete'):
+            self.toggle(method, '/api/recipes/0/shopping_cart/', 404)
+
+    def test_subscribe(self):
+        author = self.authors[0]
+        url = f'/api/users/{author.id}/subscribe/'
+        response = self.toggle('post', url, 201)
+        self.assertEqual(response.json()['id'], author.id)
+        self.toggle('post', url, 400)
+        author.refresh_from_db()
+        self.assertEqual(author.followers_count, 1)
+        self.assertTrue(TimelineJob.objects.filter(
+            kind=TimelineJob.BACKFILL, user_id=self.user.id,
+            author_id=author.id,
+        ).exists())
+        self.toggle('delete', url, 204)
+        self.toggle('delete', url, 404)
+        author.refresh_from_db()
+        self.assertEqual(author.followers_count, 0)
+        self.assertTrue(TimelineJob.objects.filter(
+            kind=TimelineJob.PRUNE, user_id=self.user.id,
+        ).exists())
+
+    def test_subscribe_to_self(self):
+        with self.assertNumQueries(0):
+            self.toggle('post', f'/api/users/{self.user.id}/subscribe/', 400)
+
+    @skipUnless(
+        connection.vendor == 'postgresql', 'Один запрос только на PostgreSQL'
+    )
+    def test_single_query(self):
+        recipe = self.recipes[0]
+        for method in ('post', 'delete'):
+            with self.subTest(method=method), self.assertNumQueries(1):
+                self.toggle(
+                    method, f'/api/recipes/{recipe.id}/shopping_cart/',
+                    201 if method == 'post' else 204,
+                )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ReplicaRoutingTests(SimpleTestCase):
+    """Безопасные запросы читают реплику, после записи — основную базу."""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        for patcher in (
+            mock.patch.object(replica_pool, 'aliases', ('replica',)),
+            mock.patch.object(replica_pool, 'choose', return_value='replica'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def route(self, method, response=None, model=Recipe, **headers):
+        """Алиас, с которого запрос прочитал бы model."""
+        routed = []
+
+        def view(request):
+            routed.append(ReplicaRouter().db_for_read(model))
+            return response or Response()
+
+        ReplicaRoutingMiddleware(view)(
+            getattr(self.factory, method)('/api/recipes/', **headers)
+        )
+        self.assertIsNone(read_alias.get())
+        return routed[0] or DEFAULT_DB_ALIAS
+
+    def test_safe_request_reads_replica(self):
+        self.assertEqual(self.route('get'), 'replica')
+
+    def test_unsafe_request_uses_primary(self):
+        self.assertEqual(self.route('post'), DEFAULT_DB_ALIAS)
+
+    def test_read_your_writes(self):
+        self.route('post', HTTP_AUTHORIZATION='Token writer')
+        self.assertEqual(
+            self.route('get', HTTP_AUTHORIZATION='Token writer'),
+            DEFAULT_DB_ALIAS,
+        )
+        self.assertEqual(
+            self.route('get', HTTP_AUTHORIZATION='Token reader'), 'replica'
+        )
+
+    @override_settings(DATABASE_REPLICA_STICKY_SECONDS=0)
+    def test_window_expires(self):
+        self.route('post', HTTP_AUTHORIZATION='Token writer')
+        self.assertEqual(
+            self.route('get', HTTP_AUTHORIZATION='Token writer'), 'replica'
+        )
+
+    def test_login_sticks_issued_token(self):
+        self.route('post', response=Response({'auth_token': 'issued'}))
+        self.assertEqual(
+            self.route('get', HTTP_AUTHORIZATION='Token issued'),
+            DEFAULT_DB_ALIAS,
+        )
+
+    def test_tokens_read_from_primary(self):
+        self.assertEqual(self.route('get', model=Token), DEFAULT_DB_ALIAS)
+
+
+class CatalogViewsTests(FoodgramTestCase):
+    """Асинхронные списки справочников подключены только под ASGI."""
+
+    def test_wsgi_keeps_viewsets(self):
+        for url in ('/api/tags/', '/api/ingredients/'):
+            with self.subTest(url=url):
+                self.assertIn('ETag', self.client.get(url))
+                self.assertIn('name', self.client.options(url).json())
+                self.assertEqual(
+                    self.client.get(url, {'format': 'api'})['Content-Type'],
+                    'text/html; charset=utf-8',
+                )
+
+    def test_asgi_urlconf(self):
+        for url, view in (
+            ('/api/tags/', tag_list),
+            ('/api/ingredients/', ingredient_list),
+        ):
+            with self.subTest(url=url):
+                self.assertIs(resolve(url, ASGI_URLCONF).func, view)
+                self.assertIsNot(resolve(url).func, view)
+        self.assertEqual(
+            resolve('/api/recipes/', ASGI_URLCONF).func.cls, RecipeViewset
+        )
+
+    @override_settings(ROOT_URLCONF=ASGI_URLCONF)
+    async def test_async_views_match_viewsets(self):
+        for url in ('/api/tags/', '/api/ingredients/?name=ингр'):
+            with self.subTest(url=url):
+                response = await AsyncClient().get(url)
+                self.assertEqual(response.status_code, 200)
+                with override_settings(ROOT_URLCONF='foodgram_backend.urls'):
+                    expected = await sync_to_async(self.client.get)(url)
+                self.assertEqual(response.json(), expected.json())
+
+
+class ShoppingListDownloadTests(FoodgramTestCase):
+    """Выгрузка списка покупок в txt, csv и json."""
+
+    url = '/api/recipes/download_shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        salt, pinch = (
+            Ingredient.objects.create(name='Соль', measurement_unit=unit)
+            for unit in ('г', 'щепотка')
+        )
+        for ingredient, amount in ((salt, 2), (salt, 3), (pinch, 1)):
+            recipe = Recipe.objects.create(
+                author=cls.authors[0], name='Солёное', text='Текст',
+                cooking_time=5,
+            )
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount
+            )
+            Shopping.objects.create(user=cls.user, recipe=recipe)
+
+    def download(self, format):
+        response = self.client.get(self.url, {'format': format})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Disposition'],
+            f'attachment; filename=shopping-list.{format}',
+        )
+        return b''.join(response.streaming_content).decode()
+
+    def test_txt(self):
+        self.assertEqual(
+            self.download('txt'), 'Соль - 5 г;\nСоль - 1 щепотка;\n'
+        )
+
+    def test_csv(self):
+        self.assertEqual(
+            list(csv.reader(StringIO(self.download('csv')))),
+            [
+                ['Ингредиент', 'Единица измерения', 'Количество'],
+                ['Соль', 'г', '5'],
+                ['Соль', 'щепотка', '1'],
+            ],
+        )
+
+    def test_json(self):
+        self.assertEqual(json.loads(self.download('json')), [
+            {'name': 'Соль', 'measurement_unit': 'г', 'amount': 5},
+            {'name': 'Соль', 'measurement_unit': 'щепотка', 'amount': 1},
+        ])
+
+    def test_empty(self):
+        Shopping.objects.filter(user=self.user).delete()
+        self.assertEqual(json.loads(self.download('json')), [])
+        self.assertEqual(self.download('txt'), '')
+
+    def test_errors_are_json(self):
+        self.client.force_authenticate(None)
+        for format in ('txt', 'csv', 'json'):
+            with self.subTest(format=format):
+                response = self.client.get(self.url, {'format': format})
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                self.assertIn('detail', response.json())
+
+
+class SparseFieldsTests(FoodgramTestCase):
+    """?fields=, ?expand= и ?profile= для списка рецептов."""
+
+    def results(self, query=''):
+        response = self.client.get(f'/api/recipes/?limit=100&{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def recipe_sql(self, query):
+        with CaptureQueriesContext(connection) as context:
+            self.results(query)
+        return next(
+            item['sql'] for item in context.captured_queries
+            if item['sql'].startswith('SELECT "recipes_recipe"."id"')
+        )
+
+    def test_fields(self):
+        for recipe in self.results('fields=id,name,is_favorited'):
+            self.assertEqual(set(recipe), {'id', 'name', 'is_favorited'})
+
+    def test_expand(self):
+        recipe = self.results('fields=id,author,tags')[0]
+        self.assertIsInstance(recipe['author'], int)
+        self.assertTrue(all(isinstance(tag, int) for tag in recipe['tags']))
+        recipe = self.results('fields=id&expand=author')[0]
+        self.assertEqual(set(recipe), {'id', 'author'})
+        self.assertEqual(recipe['author']['username'], 'author2')
+
+    def test_compact_profile(self):
+        for recipe in self.results('profile=compact'):
+            self.assertEqual(set(recipe), set(COMPACT_RECIPE_FIELDS))
+            self.assertIsInstance(recipe['tags'][0], dict)
+
+    def test_unknown_names(self):
+        for query, key in (
+            ('fields=id,missing', 'fields'),
+            ('expand=name', 'expand'),
+            ('profile=missing', 'profile'),
+        ):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/recipes/?{query}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(key, response.json())
+
+    def test_text_deferred_only_when_not_requested(self):
+        self.assertNotIn('"text"', self.recipe_sql('fields=id,name'))
+        self.assertIn('"text"', self.recipe_sql('fields=id,text'))
+        self.assertIn('"text"', self.recipe_sql(''))
+
+    def test_sparse_and_full_are_cached_apart(self):
+        sparse = self.results('fields=id,name')
+        full = self.results()
+        self.assertEqual(set(sparse[0]), {'id', 'name'})
+        self.assertIn('text', full[0])
+        self.assertIn('ingredients', full[0])
+        self.assertEqual(
+            set(self.results('fields=id,name')[0]), {'id', 'name'}
+        )
+
+    def test_cache_keys(self):
+        request = APIRequestFactory().get('/api/recipes/')
+        recipes = self.recipes[:1]
+
+        def key(*args):
+            return recipe_cache_keys(recipes, request, Fieldset(*args))
+
+        self.assertNotEqual(key(), key(('id', 'name')))
+        self.assertNotEqual(key(('id',)), key(('id',), ('author',)))
+        self.assertNotEqual(key(None, ()), key())
+        self.assertEqual(key(('id', 'name')), key(('name', 'id')))
+
+
+class BulkToggleTests(FoodgramTestCase):
+    """Массовое добавление и удаление избранного и покупок."""
+
+    def counts(self, field):
+        return dict(Recipe.objects.filter(
+            id__in=[recipe.id for recipe in self.recipes[:3]]
+        ).values_list('id', field))
+
+    def bulk(self, method, url, recipe_ids, expected_status=200):
+        response = getattr(self.client, method)(
+            url, {'recipes': recipe_ids}, format='json'
+        )
+        self.assertEqual(response.status_code, expected_status)
+        return response.json()
+
+    def test_favorites(self):
+        first, second, third = (recipe.id for recipe in self.recipes[:3])
+        unknown = self.recipes[-1].id + 100
+        Favorites.objects.create(user=self.user, recipe_id=first)
+        self.assertEqual(
+            self.bulk('post', '/api/recipes/favorite/',
+                      [first, second, second, unknown]),
+            {'results': [
+                {'id': first, 'status': 'already_added'},
+                {'id': second, 'status': 'added'},
+                {'id': unknown, 'status': 'not_found'},
+            ]},
+        )
+        self.assertEqual(
+            self.counts('favorites_count'), {first: 1, second: 1, third: 0}
+        )
+        self.assertEqual(
+            self.bulk('delete', '/api/recipes/favorite/',
+                      [first, third, unknown]),
+            {'results': [
+                {'id': first, 'status': 'removed'},
+                {'id': third, 'status': 'not_added'},
+                {'id': unknown, 'status': 'not_found'},
+            ]},
+        )
+        self.assertEqual(
+            self.counts('favorites_count'), {first: 0, second: 1, third: 0}
+        )
+        self.assertEqual(
+            list(Favorites.objects.filter(user=self.user).values_list(
+                'recipe_id', flat=True
+            )),
+            [second],
+        )
+
+    def test_shopping_cart(self):
+        recipe_ids = [recipe.id for recipe in self.recipes[:3]]
+        self.bulk('post', '/api/recipes/shopping_cart/', recipe_ids)
+        self.assertEqual(
+            self.counts('shopping_count'), dict.fromkeys(recipe_ids, 1)
+        )
+        self.bulk('delete', '/api/recipes/shopping_cart/', recipe_ids[1:])
+        self.assertEqual(
+            self.counts('shopping_count'),
+            {recipe_ids[0]: 1, recipe_ids[1]: 0, recipe_ids[2]: 0},
+        )
+
+    def test_empty_list(self):
+        for method in ('post', 'delete'):
+            with self.subTest(method=method):
+                self.assertIn('recipes', self.bulk(
+                    method, '/api/recipes/favorite/', [], 400
+                ))
+
+
+class ORJSONTests(FoodgramTestCase):
+    """Рендерер и парсер на orjson ведут себя как стандартные."""
+
+    def test_renderer_matches_json_renderer(self):
+        data = {
+            'decimal': Decimal('12.50'),
+            'amounts': [Decimal('0.1'), Decimal('100'), 2.5, -3],
+            'created': datetime(2024, 1, 2, 3, 4, 5, 123456,
+                                tzinfo=dt_timezone.utc),
+            'naive': datetime(2024, 1, 2, 3, 4, 5),
+            'date': date(2024, 1, 2),
+            'name': 'Борщ «с пампушками» — \u2028\u2029 </script>',
+            'lazy': gettext_lazy('Рецепт'),
+            'nested': [{1: None, 'flag': True}],
+        }
+        self.assertEqual(
+            ORJSONRenderer().render(data), JSONRenderer().render(data)
+        )
+
+    def test_indent_uses_json_renderer(self):
+        data = {'name': 'Борщ'}
+        self.assertEqual(
+            ORJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
+
+    def test_parse_error(self):
+        response = self.client.post(
+            '/api/recipes/', data=b'{"name": ', content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('JSON parse error', response.json()['detail'])
+
+    def test_parse_other_charset(self):
+        self.assertEqual(
+            ORJSONParser().parse(
+                BytesIO('{"name": "café"}'.encode('latin-1')),
+                parser_context={'encoding': 'latin-1'},
+            ),
+            {'name': 'café'},
+        )
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+
+    body = b'{"name": "recipe"}' * 200
+
+    def respond(self, response, accept_encoding='gzip, br'):
+        request = RequestFactory().get(
+            '/api/recipes/', HTTP_ACCEPT_ENCODING=accept_encoding
+        )
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_choose_encoding(self):
+        for header, encoding in (
+            ('gzip, br', 'br'),
+            ('gzip', 'gzip'),
+            ('br;q=0.5, gzip', 'gzip'),
+            ('*', 'br'),
+            ('br;q=0, gzip;q=0', None),
+            ('', None),
+        ):
+            with self.subTest(header=header):
+                self.assertEqual(choose_encoding(header), encoding)
+
+    def test_gzip(self):
+        response = self.respond(HttpResponse(self.body), 'gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(
+            response['Content-Length'], str(len(response.content))
+        )
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_brotli(self):
+        response = self.respond(HttpResponse(self.body))
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), self.body)
+
+    def test_weak_etag(self):
+        response = HttpResponse(self.body)
+        response['ETag'] = '"abc"'
+        self.assertEqual(self.respond(response)['ETag'], 'W/"abc"')
+
+    def test_vary_without_compression(self):
+        response = self.respond(HttpResponse(self.body), 'identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response.content, self.body)
+
+    def test_small_body(self):
+        body = b'x' * (q.COMPRESSION_MIN_SIZE - 1)
+        response = self.respond(HttpResponse(body))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertFalse(response.has_header('Vary'))
+        self.assertEqual(response.content, body)
+
+    def test_streaming(self):
+        chunks = [self.body[:1000], self.body[1000:]]
+        for encoding, decompress in (
+            ('gzip', gzip.decompress), ('br', brotli.decompress)
+        ):
+            with self.subTest(encoding=encoding):
+                response = StreamingHttpResponse(iter(chunks))
+                response['Content-Length'] = str(len(self.body))
+                response = self.respond(response, encoding)
+                self.assertEqual(response['Content-Encoding'], encoding)
+                self.assertFalse(response.has_header('Content-Length'))
+                self.assertEqual(
+                    decompress(b''.join(response.streaming_content)),
+                    self.body,
+                )
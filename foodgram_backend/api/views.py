@@ -1,28 +1,44 @@
 from django_filters.rest_framework import DjangoFilterBackend
-from django.shortcuts import get_object_or_404
-from django.http import FileResponse
+from django.http import Http404, StreamingHttpResponse
+from django.utils.decorators import method_decorator
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
 from djoser.views import UserViewSet as DjoserUserViewSet
-from django.db.models import Prefetch
+from django.db.models import (Exists, F, OuterRef, Prefetch, Sum,
+                              Window, prefetch_related_objects)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 
+from recipes.catalog import ingredient_index
+from recipes.toggles import toggle_link
 from recipes.models import (
+    Favorites,
     Subscribe,
     Ingredient,
     Recipe,
     RecipeIngredient,
+    Shopping,
     Tag
 )
 from users.models import User
-from api.pagination import LimitedPagePagination
-from .filters import IngredientFilter, RecipeFilter
+from api.pagination import (CursorPaginationMixin, LimitedPagePagination,
+                            PageLimitPagination, TimelineCursorPagination)
+from .caching import catalog_cache
+from .fieldsets import SparseFieldsViewMixin
+from .filters import RecipeFilter
+from .renderers import (ORJSONRenderer, ShoppingListCSVRenderer,
+                        ShoppingListJSONRenderer, ShoppingListRendererMixin,
+                        ShoppingListTextRenderer)
 from .serializers import (
     UserGetSerializer,
     IngredientSerializer,
     RecipeCreateSerializer,
+    RecipeIdsSerializer,
     RecipeListSerializer,
     FavoriteSerializer,
     ShoppingCartSerializer,
@@ -32,48 +48,90 @@ from .serializers import (
 )
 
 
-class UserViewSet(DjoserUserViewSet):
+class UserViewSet(SparseFieldsViewMixin, CursorPaginationMixin,
+                  DjoserUserViewSet):
     queryset = User.objects.all()
     serializer_class = UserGetSerializer
     pagination_class = LimitedPagePagination
+    cursor_ordering = ('id',)
 
     @action(detail=True, methods=('post',),
             permission_classes=(IsAuthenticated,))
     def subscribe(self, request, **kwargs):
-        user = self.request.user
-        author = get_object_or_404(User, id=kwargs['id'])
-        serializer = SubscriptionSerializer(
-            data={
-                'author': author.id,
-                'user': user.id
-            },
-            context={'request': request}
+        if kwargs['id'] == str(request.user.id):
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                'Вы не можете подписаться на себя.'
+            ]})
+        author = toggle_link(Subscribe, request.user, kwargs['id'], add=True)
+        if author is None:
+            raise Http404
+        serializer = SubscriptionSerializer(context={'request': request})
+        if not author.toggled:
+            raise ValidationError(serializer.duplicate_error)
+        return Response(
+            serializer.to_representation(
+                Subscribe(user=request.user, author=author)
+            ),
+            status=status.HTTP_201_CREATED,
         )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @subscribe.mapping.delete
     def unsubscribe(self, request, **kwargs):
-        author = get_object_or_404(User, id=kwargs['id'])
-        subscription = get_object_or_404(
-            Subscribe, user=request.user, author=author)
-        subscription.delete()
+        author = toggle_link(Subscribe, request.user, kwargs['id'], add=False)
+        if author is None or not author.toggled:
+            raise Http404
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    def limit_recipes(authors, limit):
+        recipes = Recipe.objects.all()
+        if limit is None:
+            return recipes
+        if not authors:
+            return recipes.none()
+        ranked = Recipe.objects.filter(author__in=authors).annotate(
+            recipe_rank=Window(
+                expression=RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            )
+        ).values('id', 'recipe_rank')
+        sql, params = ranked.query.sql_with_params()
+        return recipes.filter(id__in=RawSQL(
+            f'SELECT id FROM ({sql}) AS ranked WHERE recipe_rank <= %s',
+            (*params, limit)
+        ))
+
     @action(detail=False, permission_classes=(IsAuthenticated,))
     def subscriptions(self, request):
         authors = User.objects.filter(author__user=request.user)
         authors_paginate = self.paginate_queryset(authors)
+        fieldset = self.get_fieldset(SubscribeSerializer)
+        try:
+            limit = int(request.query_params.get('recipes_limit'))
+        except (TypeError, ValueError):
+            limit = None
+        lookups = [
+            lookup for lookup in ('groups', 'user_permissions')
+            if fieldset.includes(lookup)
+        ]
+        if fieldset.includes('recipes'):
+            lookups.append(Prefetch(
+                'recipes',
+                queryset=self.limit_recipes(authors_paginate, limit),
+                to_attr='limited_recipes',
+            ))
+        prefetch_related_objects(authors_paginate, *lookups)
         serializer = SubscribeSerializer(
             authors_paginate,
             many=True,
-            context={'request': request}
+            context={'request': request},
+            **fieldset._asdict()
         )
         return self.get_paginated_response(serializer.data)
 
 
+@method_decorator(catalog_cache, name='dispatch')
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
 
     queryset = Tag.objects.all()
@@ -81,23 +139,41 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
 
 
+@method_decorator(catalog_cache, name='dispatch')
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
 
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
     pagination_class = None
-    filter_backends = (IngredientFilter,)
-    search_fields = ('name',)
+
+    def list(self, request, *args, **kwargs):
+        return Response(
+            ingredient_index.search(request.query_params.get('name', ''))
+        )
 
 
-class RecipeViewset(viewsets.ModelViewSet):
+class RecipeViewset(SparseFieldsViewMixin, CursorPaginationMixin,
+                    viewsets.ModelViewSet):
 
-    queryset = Recipe.objects.select_related('author').prefetch_related(
-        Prefetch('tags', queryset=Tag.objects.all()),
-        Prefetch('ingredients', queryset=Ingredient.objects.all()),
-    )
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    pagination_class = PageLimitPagination
+
+    def get_queryset(self):
+        queryset = Recipe.objects.all()
+        fieldset = self.get_fieldset()
+        if not fieldset.includes('text'):
+            queryset = queryset.defer('text')
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+        for name, model in (('is_favorited', Favorites),
+                            ('is_in_shopping_cart', Shopping)):
+            if fieldset.includes(name):
+                queryset = queryset.annotate(**{name: Exists(
+                    model.objects.filter(user=user, recipe=OuterRef('pk'))
+                )})
+        return queryset
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
@@ -106,66 +182,118 @@ class RecipeViewset(viewsets.ModelViewSet):
 
     def action_post_delete(self, pk, serializer_class):
         user = self.request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-        model_obj = serializer_class.Meta.model.objects.filter(
-            user=user, recipe=recipe
-        )
+        model = serializer_class.Meta.model
+        add = self.request.method == 'POST'
+        recipe = toggle_link(model, user, pk, add)
+        if recipe is None:
+            raise Http404
+        serializer = serializer_class(context={'request': self.request})
 
-        if self.request.method == 'POST':
-            serializer = serializer_class(
-                data={'user': user.id, 'recipe': pk},
-                context={'request': self.request}
+        if add:
+            if not recipe.toggled:
+                raise ValidationError(serializer.duplicate_error)
+            return Response(
+                serializer.to_representation(model(user=user, recipe=recipe)),
+                status=status.HTTP_201_CREATED,
             )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-        if self.request.method == 'DELETE':
-            if not model_obj.exists():
-                return Response({'error': 'Этого рецепта нет в избранном.'},
-                                status=status.HTTP_400_BAD_REQUEST)
-        model_obj.delete()
+
+        if not recipe.toggled:
+            return Response({'error': 'Этого рецепта нет в избранном.'},
+                            status=status.HTTP_400_BAD_REQUEST)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def bulk_post_delete(self, serializer_class):
+        serializer = RecipeIdsSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        model = serializer_class.Meta.model
+        user = self.request.user
+        found = dict(Recipe.objects.filter(id__in=recipe_ids).annotate(
+            present=Exists(model.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            ))
+        ).order_by().values_list('id', 'present'))
+        if self.request.method == 'POST':
+            model.objects.bulk_create(
+                [
+                    model(user=user, recipe_id=recipe_id)
+                    for recipe_id, present in found.items() if not present
+                ],
+                ignore_conflicts=True,
+            )
+            outcomes = {True: 'already_added', False: 'added'}
+        else:
+            model.objects.filter(user=user, recipe_id__in=[
+                recipe_id for recipe_id, present in found.items() if present
+            ]).bulk_delete()
+            outcomes = {True: 'removed', False: 'not_added'}
+        return Response({'results': [
+            {
+                'id': recipe_id,
+                'status': (outcomes[found[recipe_id]]
+                           if recipe_id in found else 'not_found'),
+            }
+            for recipe_id in recipe_ids
+        ]})
+
     @action(methods=['POST', 'DELETE'], detail=True,
             permission_classes=[IsAuthenticated])
     def favorite(self, request, pk=None):
         return self.action_post_delete(pk, FavoriteSerializer)
 
+    @action(methods=['POST', 'DELETE'], detail=False, url_path='favorite',
+            url_name='favorite-bulk', permission_classes=[IsAuthenticated])
+    def favorite_bulk(self, request):
+        return self.bulk_post_delete(FavoriteSerializer)
+
     @action(methods=['POST', 'DELETE'], detail=True,
             permission_classes=[IsAuthenticated])
     def shopping_cart(self, request, pk=None):
         return self.action_post_delete(pk, ShoppingCartSerializer)
 
-    @staticmethod
-    def forming_string(ingredients):
-        shopping_data = {}
-        for ingredient in ingredients:
-            if str(ingredient['ingredient__name']) in shopping_data:
-                shopping_data[
-                    str(
-                        ingredient['ingredient__name']
-                    )] += ingredient['amount']
-            else:
-                shopping_data[
-                    str(
-                        ingredient['ingredient__name']
-                    )] = ingredient['amount']
-
-        content = ''
-        for ingredient, amount in shopping_data.items():
-            content += f"{ingredient} - {amount};\n"
-        return content
+    @action(methods=['POST', 'DELETE'], detail=False,
+            url_path='shopping_cart', url_name='shopping-cart-bulk',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_bulk(self, request):
+        return self.bulk_post_delete(ShoppingCartSerializer)
 
     @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        recipes = self.filter_queryset(self.get_queryset()).filter(
+            timeline_entries__user=request.user
+        ).annotate(feed_date=F('timeline_entries__pub_date'))
+        paginator = TimelineCursorPagination()
+        page = paginator.paginate_queryset(recipes, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def handle_exception(self, exc):
+        """Ошибки выгрузки списка покупок отдаются в JSON, как везде."""
+        if isinstance(getattr(self.request, 'accepted_renderer', None),
+                      ShoppingListRendererMixin):
+            self.request.accepted_renderer = ORJSONRenderer()
+            self.request.accepted_media_type = ORJSONRenderer.media_type
+        return super().handle_exception(exc)
+
+    @action(detail=False, permission_classes=[IsAuthenticated],
+            renderer_classes=(ShoppingListTextRenderer,
+                              ShoppingListCSVRenderer,
+                              ShoppingListJSONRenderer))
     def download_shopping_cart(self, request):
         ingredients = RecipeIngredient.objects.filter(
             recipe__shopping__user=request.user
-        ).select_related('ingredient').values('ingredient__name', 'amount')
-        content = self.forming_string(ingredients)
-        filename = 'shopping-list.txt'
-        response = FileResponse(content, content_type='text/plain',
-                                status=status.HTTP_200_OK)
+        ).values(
+            'ingredient__name', 'ingredient__measurement_unit'
+        ).annotate(
+            total_amount=Sum('amount')
+        ).order_by('ingredient__name', 'ingredient__measurement_unit')
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients.iterator()),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
+            status=status.HTTP_200_OK,
+        )
+        filename = f'shopping-list.{renderer.format}'
         response['Content-Disposition'] = 'attachment; filename={0}'.format(
             filename)
         return response
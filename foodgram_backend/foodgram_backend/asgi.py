@@ -0,0 +1,20 @@
+import os
+
+import django
+from django.core.handlers.asgi import ASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_backend.settings')
+
+ASGI_URLCONF = 'foodgram_backend.asgi_urls'
+
+
+class CatalogASGIHandler(ASGIHandler):
+    """Обработчик с отдельным URLconf для асинхронных вьюх."""
+
+    async def get_response_async(self, request):
+        request.urlconf = ASGI_URLCONF
+        return await super().get_response_async(request)
+
+
+django.setup(set_prefix=False)
+application = CatalogASGIHandler()
@@ -0,0 +1,15 @@
+"""URLconf ASGI-воркеров: списки справочников отдают асинхронные вьюхи.
+
+Синхронные воркеры работают с обычным URLconf, где эти пути
+обслуживают вьюсеты DRF.
+"""
+from django.urls import path
+
+from api.async_views import ingredient_list, tag_list
+from .urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = [
+    path('api/tags/', tag_list),
+    path('api/ingredients/', ingredient_list),
+    *wsgi_urlpatterns,
+]
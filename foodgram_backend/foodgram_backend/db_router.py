@@ -0,0 +1,126 @@
+"""Чтение с реплик для безопасных запросов, запись — в основную базу.
+
+Middleware выбирает реплику один раз на запрос и кладёт её алиас в
+контекстную переменную, роутер только читает её. Пользователь, который
+недавно писал в базу, читает из основной базы, пока реплики догоняют.
+"""
+import hashlib
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+read_alias = ContextVar('read_alias', default=None)
+
+STICKY_KEY = 'db_primary:{0}'
+
+# Токены только что вошедших пользователей на реплике может ещё не быть.
+PRIMARY_APPS = frozenset({'authtoken'})
+
+
+class ReplicaPool:
+    """Выбор здоровой реплики: по кругу или давнее всех отказавшей."""
+
+    def __init__(self, aliases, strategy, check_interval):
+        self.aliases = tuple(aliases)
+        self.strategy = strategy
+        self.check_interval = check_interval
+        self.failed_at = dict.fromkeys(self.aliases, float('-inf'))
+        self.checked_at = dict.fromkeys(self.aliases, float('-inf'))
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            due = now - self.checked_at[alias] >= self.check_interval
+            if due:
+                self.checked_at[alias] = now
+        if due:
+            try:
+                with connections[alias].cursor() as cursor:
+                    cursor.execute('SELECT 1')
+            except DatabaseError:
+                logger.warning('Реплика %s недоступна', alias, exc_info=True)
+                self.failed_at[alias] = now
+        return now - self.failed_at[alias] >= self.check_interval
+
+    def choose(self):
+        """Алиас реплики или основной базы, если здоровых реплик нет."""
+        healthy = [alias for alias in self.aliases if self.is_healthy(alias)]
+        if not healthy:
+            return DEFAULT_DB_ALIAS
+        if self.strategy == 'least-failed':
+            oldest = min(self.failed_at[alias] for alias in healthy)
+            healthy = [
+                alias for alias in healthy if self.failed_at[alias] == oldest
+            ]
+        return healthy[next(self._counter) % len(healthy)]
+
+
+replica_pool = ReplicaPool(
+    settings.DATABASE_REPLICAS,
+    settings.DATABASE_REPLICA_STRATEGY,
+    settings.DATABASE_REPLICA_CHECK_INTERVAL,
+)
+
+
+def sticky_key(credentials):
+    return STICKY_KEY.format(hashlib.md5(credentials.encode()).hexdigest())
+
+
+def request_credentials(request):
+    """Токен или сессия клиента, None для анонимов."""
+    return request.META.get('HTTP_AUTHORIZATION') or (
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+
+
+def is_sticky(request):
+    credentials = request_credentials(request)
+    return credentials is not None and (
+        cache.get(sticky_key(credentials)) is not None
+    )
+
+
+def stick_to_primary(request, response):
+    """Закрепляет клиента за основной базой.
+
+    Вход — анонимный POST, поэтому закрепляется и выданный в ответе
+    токен: иначе первый запрос с ним может прочитать отстающую реплику.
+    """
+    credentials = [request_credentials(request)]
+    data = getattr(response, 'data', None)
+    if isinstance(data, dict) and data.get('auth_token'):
+        credentials.append(f'Token {data["auth_token"]}')
+    cache.set_many(
+        {sticky_key(item): 1 for item in credentials if item},
+        timeout=settings.DATABASE_REPLICA_STICKY_SECONDS,
+    )
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        alias = read_alias.get()
+        if (alias is None
+                or model._meta.app_label in PRIMARY_APPS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
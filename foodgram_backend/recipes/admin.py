@@ -28,7 +28,7 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = (IngredientRecipeInline,)
 
     def recipe_in_favorites_count(self, recipe):
-        return recipe.favorites.count()
+        return recipe.favorites_count
 
     def ingradients_in_recipes(self, obj):
         return ',\n '.join([
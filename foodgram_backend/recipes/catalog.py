@@ -0,0 +1,169 @@
+"""Справочники ингредиентов и тегов, закешированные в памяти процесса."""
+import bisect
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Value
+
+from .models import CatalogVersion, Ingredient, Tag
+
+CATALOG_VERSION_KEY = 'catalog_version'
+
+
+def get_catalog_version():
+    """Текущая версия справочников, общая для всех процессов.
+
+    Хранится в основной базе, кеш только избавляет от запроса:
+    вытесненный ключ перечитывается, а не создаётся заново.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is not None:
+        return version
+    version = CatalogVersion.objects.using(DEFAULT_DB_ALIAS).get_or_create(
+        pk=1, defaults={'version': time.time_ns()}
+    )[0].version
+    cache.add(CATALOG_VERSION_KEY, version, timeout=None)
+    return version
+
+
+def bump_catalog_version():
+    """Вызывается при любом изменении тегов и ингредиентов."""
+    version = time.time_ns()
+    CatalogVersion.objects.update_or_create(
+        pk=1, defaults={'version': version}
+    )
+    cache.set(CATALOG_VERSION_KEY, version, timeout=None)
+
+
+class CatalogSnapshot:
+    """Снимок справочников в памяти процесса, привязанный к их версии.
+
+    _load читает основную базу: новая версия видна сразу, а реплика
+    может ещё не получить изменение, и устаревший снимок остался бы
+    до следующей смены версии.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Следующее обращение перечитает снимок из базы."""
+        with self._lock:
+            self._snapshot = (None, *self.empty)
+
+    def _get_snapshot(self):
+        version = get_catalog_version()
+        if self._snapshot[0] != version:
+            with self._lock:
+                if self._snapshot[0] != version:
+                    self._snapshot = (version, *self._load())
+        return self._snapshot
+
+
+class IngredientIndex(CatalogSnapshot):
+    """Поиск ингредиентов по началу названия без обращения к базе.
+
+    Каталог загружается один раз на процесс в массив, отсортированный
+    по названию в нижнем регистре, и перечитывается при смене версии
+    справочников. Совпадения по началу названия ищутся бинарным поиском
+    и идут раньше совпадений по подстроке.
+    """
+
+    empty = ([], [])
+
+    @staticmethod
+    def _load():
+        items = sorted(
+            Ingredient.objects.using(DEFAULT_DB_ALIAS).values(
+                'id', 'name', 'measurement_unit'
+            ),
+            key=lambda item: (
+                item['name'].casefold(), item['measurement_unit']
+            ),
+        )
+        return [item['name'].casefold() for item in items], items
+
+    def search(self, query=''):
+        _, keys, items = self._get_snapshot()
+        query = query.strip().casefold()
+        if not query:
+            return items
+        start = end = bisect.bisect_left(keys, query)
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        terms = query.replace(',', ' ').split()
+        return items[start:end] + [
+            item for key, item in zip(keys, items)
+            if not key.startswith(query)
+            and all(term in key for term in terms)
+        ]
+
+
+class TagCatalog(CatalogSnapshot):
+    """Список тегов в памяти процесса для выдачи и фильтра по слагам."""
+
+    empty = ([], {})
+
+    @staticmethod
+    def _load():
+        items = list(Tag.objects.using(DEFAULT_DB_ALIAS).values(
+            'id', 'name', 'slug', 'color'
+        ))
+        return items, {item['slug']: item['id'] for item in items}
+
+    def items(self):
+        return self._get_snapshot()[1]
+
+    def ids_by_slug(self):
+        return self._get_snapshot()[2]
+
+
+class CatalogIds(CatalogSnapshot):
+    """Множества id ингредиентов и тегов для проверки рецептов.
+
+    Id, которых нет в снимке, перепроверяются одним запросом: другой
+    процесс мог добавить запись раньше, чем сменилась версия.
+    """
+
+    empty = (frozenset(), frozenset())
+
+    @staticmethod
+    def _load():
+        return (
+            frozenset(Ingredient.objects.using(
+                DEFAULT_DB_ALIAS
+            ).order_by().values_list('id', flat=True)),
+            frozenset(Tag.objects.using(
+                DEFAULT_DB_ALIAS
+            ).order_by().values_list('id', flat=True)),
+        )
+
+    def missing(self, ingredient_ids, tag_ids):
+        """Несуществующие id ингредиентов и тегов."""
+        _, ingredients, tags = self._get_snapshot()
+        unknown = {
+            'ingredient': set(ingredient_ids) - ingredients,
+            'tag': set(tag_ids) - tags,
+        }
+        querysets = [
+            model.objects.filter(id__in=ids).order_by().values_list(
+                'id', Value(kind)
+            )
+            for model, kind, ids in (
+                (Ingredient, 'ingredient', unknown['ingredient']),
+                (Tag, 'tag', unknown['tag']),
+            )
+            if ids
+        ]
+        if querysets:
+            for pk, kind in querysets[0].union(*querysets[1:], all=True):
+                unknown[kind].discard(pk)
+        return unknown['ingredient'], unknown['tag']
+
+
+ingredient_index = IngredientIndex()
+tag_catalog = TagCatalog()
+catalog_ids = CatalogIds()
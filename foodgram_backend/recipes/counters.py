@@ -0,0 +1,118 @@
+"""Денормализованные счётчики избранного, покупок, рецептов и подписчиков.
+
+Для каждой модели указаны внешний ключ и поле-счётчик в связанной модели.
+"""
+from collections import defaultdict
+
+from django.db import connections, models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+COUNTED_RELATIONS = {
+    'recipes.Favorites': (('recipe', 'favorites_count'),),
+    'recipes.Shopping': (('recipe', 'shopping_count'),),
+    'recipes.Subscribe': (('author', 'followers_count'),),
+    'recipes.Recipe': (('author', 'recipes_count'),),
+}
+
+
+def shift_counters(model, objs, delta):
+    """Сдвигает счётчики на delta за каждый объект одним UPDATE на группу."""
+    for relation, counter in COUNTED_RELATIONS[model._meta.label]:
+        field = model._meta.get_field(relation)
+        per_target = defaultdict(int)
+        for obj in objs:
+            per_target[getattr(obj, field.attname)] += delta
+        by_change = defaultdict(list)
+        for target_id, change in per_target.items():
+            by_change[change].append(target_id)
+        for change, target_ids in by_change.items():
+            value = F(counter) + change
+            if change < 0:
+                value = Greatest(value, 0)
+            field.related_model.objects.filter(
+                pk__in=target_ids
+            ).update(**{counter: value})
+
+
+def recount_counters(model, objs=None, **lookups):
+    """Пересчитывает счётчики по фактическим строкам модели.
+
+    Если переданы objs, пересчитываются только связанные с ними строки.
+    Обновляются лишь расходящиеся значения, возвращается их число.
+    """
+    repaired = 0
+    for relation, counter in COUNTED_RELATIONS[model._meta.label]:
+        field = model._meta.get_field(relation)
+        targets = field.related_model.objects.filter(**lookups)
+        if objs is not None:
+            targets = targets.filter(
+                pk__in={getattr(obj, field.attname) for obj in objs}
+            )
+        total = Coalesce(Subquery(
+            model.objects.filter(
+                **{field.attname: OuterRef('pk')}
+            ).order_by().values(field.attname).annotate(
+                total=Count('pk')
+            ).values('total')
+        ), 0)
+        repaired += targets.exclude(
+            **{counter: total}
+        ).update(**{counter: total})
+    return repaired
+
+
+class CountedQuerySet(models.QuerySet):
+    """bulk_create и bulk_delete, которые поддерживают счётчики без сигналов.
+
+    При ignore_conflicts неизвестно, какие строки на самом деле вставлены,
+    поэтому счётчики связанных объектов пересчитываются.
+    """
+
+    def bulk_create(self, objs, batch_size=None, ignore_conflicts=False,
+                    update_counters=True):
+        objs = super().bulk_create(
+            list(objs), batch_size=batch_size,
+            ignore_conflicts=ignore_conflicts,
+        )
+        if update_counters and objs:
+            if ignore_conflicts:
+                recount_counters(self.model, objs)
+            else:
+                shift_counters(self.model, objs, 1)
+        return objs
+
+    def bulk_delete(self, update_counters=True):
+        """Удаление одним DELETE ... RETURNING, возвращает число строк.
+
+        Сигналы pre_delete и post_delete намеренно не отправляются, а
+        каскады не обрабатываются: метод только для связей без зависимых
+        объектов, у которых сигналы ведут лишь счётчики. Счётчики
+        сдвигаются по возвращённым строкам. Нужны PostgreSQL или
+        SQLite 3.35+.
+        """
+        attnames = [
+            self.model._meta.get_field(relation).attname
+            for relation, _ in COUNTED_RELATIONS[self.model._meta.label]
+        ]
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        opts = self.model._meta
+        pk = quote(opts.pk.column)
+        subquery, params = self.order_by().values('pk').query.get_compiler(
+            self.db
+        ).as_sql()
+        sql = 'DELETE FROM {0} WHERE {1} IN ({2}) RETURNING {3}'.format(
+            quote(opts.db_table), pk, subquery, ', '.join(
+                quote(opts.get_field(attname).column) for attname in attnames
+            ),
+        )
+        with transaction.atomic(using=self.db, savepoint=False):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+            if update_counters and rows:
+                shift_counters(self.model, [
+                    self.model(**dict(zip(attnames, row))) for row in rows
+                ], -1)
+        return len(rows)
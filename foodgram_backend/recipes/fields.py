@@ -0,0 +1,36 @@
+import json
+
+from django.contrib.postgres.fields import ArrayField
+
+
+class IntegerArrayField(ArrayField):
+    """Массив целых: integer[] на PostgreSQL, JSON-текст на других базах.
+
+    Запасной вариант нужен, чтобы миграции и тесты шли на SQLite;
+    лукапы массивов (__overlap, __contains) там не работают.
+    """
+
+    def db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return super().db_type(connection)
+        return 'text'
+
+    def cast_db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return super().cast_db_type(connection)
+        return 'text'
+
+    def get_placeholder(self, value, compiler, connection):
+        if connection.vendor == 'postgresql':
+            return super().get_placeholder(value, compiler, connection)
+        return '%s'
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if connection.vendor == 'postgresql' or value is None:
+            return super().get_db_prep_value(value, connection, prepared)
+        return json.dumps([int(item) for item in value])
+
+    def from_db_value(self, value, expression, connection):
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
@@ -0,0 +1,155 @@
+'''
+Общая часть management-команд загрузки справочников из csv или json.
+'''
+
+import csv
+import io
+import json
+import os
+import time
+from contextlib import nullcontext
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes.catalog import bump_catalog_version
+
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def iter_json_array(file):
+    """Построчно отдаёт объекты json-массива, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(JSON_CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидался json-массив объектов.')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(JSON_CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Файл json оборван.')
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+class CatalogLoadCommand(BaseCommand):
+    """Потоковая загрузка справочника пачками без дублей.
+
+    Наследники задают модель, порядок колонок csv и путь по умолчанию.
+    Если задан update_key, существующие по нему строки получают значения
+    update_fields и при загрузке через COPY.
+    """
+
+    model = None
+    fields = ()
+    default_path = None
+    update_key = None
+    update_fields = ()
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=self.default_path)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Загрузка через COPY (только PostgreSQL).',
+        )
+
+    def read_rows(self, file, path):
+        if os.path.splitext(path)[1].lower() == '.json':
+            for item in iter_json_array(file):
+                yield tuple(item.get(field) for field in self.fields)
+        else:
+            yield from csv.reader(file, delimiter=',')
+
+    def build_objects(self, rows):
+        objects = []
+        for row in rows:
+            if len(row) != len(self.fields) or not all(row):
+                self.skipped += 1
+                continue
+            objects.append(self.model(**dict(zip(self.fields, row))))
+        return objects
+
+    def write_batch(self, objects):
+        self.model.objects.bulk_create(objects, ignore_conflicts=True)
+
+    def copy_batch(self, objects):
+        table = self.model._meta.db_table
+        columns = ', '.join(
+            self.model._meta.get_field(field).column for field in self.fields
+        )
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for obj in objects:
+            writer.writerow(getattr(obj, field) for field in self.fields)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE IF NOT EXISTS catalog_load AS '
+                f'SELECT {columns} FROM {table} WITH NO DATA'
+            )
+            cursor.execute('TRUNCATE catalog_load')
+            cursor.copy_expert(
+                f'COPY catalog_load ({columns}) FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+            if self.update_key:
+                key = self.model._meta.get_field(self.update_key).column
+                assignments = ', '.join(
+                    f'{column} = catalog_load.{column}' for column in (
+                        self.model._meta.get_field(field).column
+                        for field in self.update_fields
+                    )
+                )
+                cursor.execute(
+                    f'UPDATE {table} SET {assignments} FROM catalog_load '
+                    f'WHERE {table}.{key} = catalog_load.{key}'
+                )
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) '
+                f'SELECT {columns} FROM catalog_load ON CONFLICT DO NOTHING'
+            )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('COPY доступен только в PostgreSQL.')
+        write_batch = self.copy_batch if options['copy'] else self.write_batch
+        self.skipped = 0
+        processed = 0
+        start = time.perf_counter()
+        count_before = self.model.objects.count()
+        outer = transaction.atomic() if options['dry_run'] else nullcontext()
+        with outer, open(path, 'r', encoding='utf-8') as file:
+            rows = self.read_rows(file, path)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                objects = self.build_objects(batch)
+                if objects:
+                    with transaction.atomic():
+                        write_batch(objects)
+                    processed += len(objects)
+            created = self.model.objects.count() - count_before
+            if options['dry_run']:
+                transaction.set_rollback(True)
+        elapsed = time.perf_counter() - start
+        if not options['dry_run']:
+            bump_catalog_version()
+        self.stdout.write(
+            f'{"Проверено" if options["dry_run"] else "Загружено"}: '
+            f'{processed} строк, новых {created}, '
+            f'пропущено {self.skipped}, {elapsed:.2f} с '
+            f'({processed / elapsed if elapsed else processed:.0f} строк/с)'
+        )
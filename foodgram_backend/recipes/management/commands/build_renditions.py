@@ -0,0 +1,50 @@
+'''
+Management-команда на создание копий изображений рецептов.
+'''
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.renditions import build_renditions, renditions_exist
+
+
+def build_one(name, force):
+    try:
+        if force or not renditions_exist(name):
+            build_renditions(name)
+    except OSError as error:
+        return name, error
+    return name, None
+
+
+class Command(BaseCommand):
+    help = 'Создание уменьшенных копий для уже загруженных изображений.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--force', action='store_true')
+
+    def handle(self, *args, **options):
+        names = list(
+            Recipe.objects.exclude(image='').order_by().values_list(
+                'image', flat=True
+            ).distinct()
+        )
+        start = time.perf_counter()
+        failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            results = executor.map(
+                build_one, names, [options['force']] * len(names),
+                chunksize=16,
+            )
+            for name, error in results:
+                if error is not None:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+        self.stdout.write(
+            f'Обработано изображений: {len(names)}, ошибок: {failed}, '
+            f'{time.perf_counter() - start:.1f} с'
+        )
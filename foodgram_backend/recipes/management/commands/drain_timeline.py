@@ -0,0 +1,45 @@
+'''
+Management-команда на выполнение отложенных задач ленты подписок.
+'''
+
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from recipes.timeline import drain
+from users import quantity as q
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('Выполнение задач ленты подписок из очереди в базе. '
+            'С --loop работает как постоянный обработчик.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Не завершаться, опрашивать очередь.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=q.TIMELINE_DRAIN_INTERVAL,
+            help='Пауза между опросами пустой очереди, секунды.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                done = drain()
+            except Exception:
+                if not options['loop']:
+                    raise
+                logger.exception('Ошибка обновления ленты')
+                connections.close_all()
+                done = 0
+            if done:
+                self.stdout.write(f'Выполнено задач ленты: {done}')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
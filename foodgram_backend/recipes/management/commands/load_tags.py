@@ -1,31 +1,30 @@
 '''
-Management-команда на добавление ингредиентов в базу данных из csv файла.
+Management-команда на добавление тегов в базу данных из csv или json.
 '''
 
-import csv
-
-from django.core.management.base import BaseCommand
-
 from recipes.models import Tag
+from ._catalog_loader import CatalogLoadCommand
 
 
-class Command(BaseCommand):
-    help = 'Загрузка ингредиентов в базу из файла csv.'
+class Command(CatalogLoadCommand):
+    help = 'Загрузка тегов в базу из файла csv или json.'
+    model = Tag
+    fields = ('name', 'color', 'slug')
+    default_path = './data/tag.csv'
+    update_key = 'slug'
+    update_fields = ('name', 'color')
 
-    def handle(self, *args, **options):
-        with open(
-            './data/tag.csv', 'r', encoding='utf-8'
-        ) as csv_file:
-            csv_reader = csv.reader(csv_file, delimiter=',')
-            tags = []
-            for row in csv_reader:
-                try:
-                    create_tags = Tag(
-                        name=row[0],
-                        color=row[1],
-                        slug=row[2],
-                    )
-                    tags.append(create_tags)
-                except ValueError:
-                    print('Несоответствие данных игнорировано.')
-            Tag.objects.bulk_create(tags)
+    def write_batch(self, objects):
+        """Существующие по слагу теги обновляются, новые создаются."""
+        existing = Tag.objects.in_bulk(
+            [tag.slug for tag in objects], field_name='slug'
+        )
+        for tag in objects:
+            if tag.slug in existing:
+                tag.pk = existing[tag.slug].pk
+        Tag.objects.bulk_update(
+            [tag for tag in objects if tag.pk], self.update_fields
+        )
+        Tag.objects.bulk_create(
+            [tag for tag in objects if not tag.pk], ignore_conflicts=True
+        )
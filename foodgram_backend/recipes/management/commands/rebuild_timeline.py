@@ -0,0 +1,54 @@
+'''
+Management-команда на заполнение ленты подписок по существующим подпискам.
+'''
+
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe, Subscribe, TimelineEntry
+from recipes.timeline import insert_entries, iter_batches
+from users import quantity as q
+
+
+class Command(BaseCommand):
+    help = 'Заполнение ленты подписок рецептами авторов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=q.TIMELINE_BATCH_SIZE,
+            help='Число подписок, обрабатываемых за один проход.',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        subscriptions = Subscribe.objects.values_list(
+            'id', 'user_id', 'author_id'
+        )
+        for batch in iter_batches(subscriptions, options['batch_size']):
+            followers = defaultdict(list)
+            for _, user_id, author_id in batch:
+                followers[author_id].append(user_id)
+            recipes = Recipe.objects.filter(
+                author_id__in=followers
+            ).order_by().values_list('id', 'author_id', 'pub_date')
+            insert_entries(
+                (
+                    TimelineEntry(
+                        user_id=user_id,
+                        author_id=author_id,
+                        recipe_id=recipe_id,
+                        pub_date=pub_date,
+                    )
+                    for recipe_id, author_id, pub_date in recipes.iterator(
+                        chunk_size=options['batch_size']
+                    )
+                    for user_id in followers[author_id]
+                ),
+                options['batch_size'],
+            )
+        self.stdout.write(
+            f'Записей в ленте: {TimelineEntry.objects.count()}, '
+            f'{time.perf_counter() - start:.1f} с'
+        )
@@ -0,0 +1,38 @@
+'''
+Management-команда на пересчёт денормализованных счётчиков.
+'''
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from recipes.counters import COUNTED_RELATIONS, recount_counters
+from recipes.models import Favorites, Recipe, Shopping, Subscribe
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт счётчиков избранного, покупок, рецептов и подписчиков.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model in (Favorites, Shopping, Subscribe, Recipe):
+            for relation, counter in COUNTED_RELATIONS[model._meta.label]:
+                target = model._meta.get_field(relation).related_model
+                start = time.perf_counter()
+                last_pk = target.objects.aggregate(last=Max('pk'))['last']
+                repaired = 0
+                for first_pk in range(0, (last_pk or 0) + 1, batch_size):
+                    repaired += recount_counters(
+                        model,
+                        pk__gte=first_pk,
+                        pk__lt=first_pk + batch_size,
+                    )
+                self.stdout.write(
+                    f'{target._meta.verbose_name_plural}.{counter}: '
+                    f'исправлено {repaired} за '
+                    f'{time.perf_counter() - start:.1f} с'
+                )
@@ -0,0 +1,250 @@
+'''
+Management-команда на заполнение базы синтетическими данными для нагрузки.
+'''
+
+import os
+import random
+import time
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from recipes.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
+                            Shopping, Subscribe, Tag)
+from recipes.renditions import build_renditions
+from users.models import User
+from users import quantity as q
+
+PLACEHOLDER_COUNT = 8
+
+
+class ZipfSampler:
+    """Выборка id с вероятностью, обратной степени ранга."""
+
+    def __init__(self, rng, ids, exponent):
+        self.rng = rng
+        self.ids = ids
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(ids) + 1)
+        ))
+
+    def sample(self, k):
+        return self.rng.choices(self.ids, cum_weights=self.cum_weights, k=k)
+
+
+class Command(BaseCommand):
+    help = 'Генерация пользователей, рецептов, избранного, покупок и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000)
+        parser.add_argument('--recipes', type=int, default=10_000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=6)
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument('--tags', type=int, default=3)
+        parser.add_argument('--favorites', type=int, default=50_000)
+        parser.add_argument('--shopping', type=int, default=20_000)
+        parser.add_argument('--subscriptions', type=int, default=20_000)
+        parser.add_argument('--zipf', type=float, default=1.1)
+        parser.add_argument('--batch-size', type=int, default=5_000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument(
+            '--images', action='store_true',
+            help='Прикрепить к рецептам сгенерированные изображения.',
+        )
+        parser.add_argument(
+            '--with-timeline', action='store_true',
+            help='Заполнить ленту подписок по созданным подпискам.',
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if len(ingredient_ids) < options['ingredients_per_recipe']:
+            raise CommandError('Сначала загрузите ингредиенты.')
+        tag_ids = self.ensure_tags(options['tags'])
+        images = self.make_images() if options['images'] else ['']
+
+        user_ids = self.timed('Пользователи', self.create_users,
+                              options['users'])
+        recipe_ids = self.timed(
+            'Рецепты', self.create_recipes, options['recipes'],
+            ZipfSampler(self.rng, user_ids, options['zipf']), images,
+        )
+        self.timed(
+            'Ингредиенты и теги рецептов', self.create_recipe_relations,
+            recipe_ids, ingredient_ids, options['ingredients_per_recipe'],
+            tag_ids, min(options['tags_per_recipe'], len(tag_ids)),
+        )
+        recipes = ZipfSampler(self.rng, recipe_ids, options['zipf'])
+        self.timed('Избранное', self.create_edges, Favorites, 'recipe_id',
+                   options['favorites'], user_ids, recipes)
+        self.timed('Покупки', self.create_edges, Shopping, 'recipe_id',
+                   options['shopping'], user_ids, recipes)
+        self.timed('Подписки', self.create_edges, Subscribe, 'author_id',
+                   options['subscriptions'], user_ids,
+                   ZipfSampler(self.rng, user_ids, options['zipf']))
+        self.timed('Счётчики', call_command, 'recount',
+                   batch_size=self.batch_size * 10, stdout=self.stdout)
+        if options['with_timeline']:
+            self.timed('Лента подписок', call_command, 'rebuild_timeline',
+                       batch_size=self.batch_size, stdout=self.stdout)
+
+    def timed(self, label, function, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.stdout.write(f'{label}: {time.perf_counter() - start:.1f} с')
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield range(start, min(start + self.batch_size, total))
+
+    def ensure_tags(self, total):
+        missing = total - Tag.objects.count()
+        offset = Tag.objects.filter(
+            slug__startswith=f'{self.prefix}-'
+        ).count()
+        Tag.objects.bulk_create(
+            Tag(
+                name=f'{self.prefix} тег {offset + index}',
+                slug=f'{self.prefix}-{offset + index}',
+                color='#{0:06x}'.format(self.rng.randrange(0x1000000)),
+            )
+            for index in range(max(missing, 0))
+        )
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def make_images(self):
+        names = []
+        for index in range(PLACEHOLDER_COUNT):
+            buffer = BytesIO()
+            Image.new(
+                'RGB', (1280, 960), tuple(self.rng.choices(range(256), k=3))
+            ).save(buffer, 'JPEG', quality=q.RECIPE_IMAGE_QUALITY)
+            name = default_storage.save(
+                os.path.join(
+                    'recipes/images', f'{self.prefix}-placeholder-{index}.jpg'
+                ),
+                ContentFile(buffer.getvalue()),
+            )
+            build_renditions(name)
+            names.append(name)
+        return names
+
+    def create_users(self, total):
+        password = make_password(None)
+        offset = User.objects.filter(
+            username__startswith=f'{self.prefix}_'
+        ).count()
+        user_ids = []
+        for batch in self.batches(total):
+            users = [
+                User(
+                    username=f'{self.prefix}_{offset + index}',
+                    email=f'{self.prefix}_{offset + index}@foodgram.local',
+                    first_name=f'Имя {offset + index}',
+                    last_name=f'Фамилия {offset + index}',
+                    password=password,
+                )
+                for index in batch
+            ]
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+            user_ids += self.saved_ids(User, users, 'username')
+        return user_ids
+
+    def create_recipes(self, total, authors, images):
+        offset = Recipe.objects.filter(
+            name__startswith=f'{self.prefix} рецепт '
+        ).count()
+        recipe_ids = []
+        for batch in self.batches(total):
+            recipes = [
+                Recipe(
+                    author_id=author_id,
+                    name=f'{self.prefix} рецепт {offset + index}',
+                    text=f'Описание рецепта {offset + index}',
+                    image=images[index % len(images)],
+                    cooking_time=self.rng.randint(q.AMOUNT_MIN_VALUE, 180),
+                )
+                for index, author_id in zip(batch, authors.sample(len(batch)))
+            ]
+            with transaction.atomic():
+                Recipe.objects.bulk_create(recipes, update_counters=False)
+            recipe_ids += self.saved_ids(Recipe, recipes, 'name')
+        return recipe_ids
+
+    @staticmethod
+    def saved_ids(model, objs, unique_field):
+        """Id после bulk_create, если база не вернула их сама."""
+        if all(obj.pk for obj in objs):
+            return [obj.pk for obj in objs]
+        ids = dict(model.objects.filter(**{
+            f'{unique_field}__in': [getattr(obj, unique_field) for obj in objs]
+        }).values_list(unique_field, 'id'))
+        return [ids[getattr(obj, unique_field)] for obj in objs]
+
+    def create_recipe_relations(self, recipe_ids, ingredient_ids, per_recipe,
+                                tag_ids, tags_per_recipe):
+        recipe_tag = Recipe.tags.through
+        step = max(self.batch_size // max(per_recipe, 1), 1)
+        for start in range(0, len(recipe_ids), step):
+            chunk = recipe_ids[start:start + step]
+            with transaction.atomic():
+                RecipeIngredient.objects.bulk_create(
+                    RecipeIngredient(
+                        recipe_id=recipe_id,
+                        ingredient_id=ingredient_id,
+                        amount=self.rng.randint(q.AMOUNT_MIN_VALUE, 500),
+                    )
+                    for recipe_id in chunk
+                    for ingredient_id in self.rng.sample(
+                        ingredient_ids, per_recipe
+                    )
+                )
+                recipe_tags = {
+                    recipe_id: sorted(
+                        self.rng.sample(tag_ids, tags_per_recipe)
+                    )
+                    for recipe_id in chunk
+                }
+                recipe_tag.objects.bulk_create(
+                    recipe_tag(recipe_id=recipe_id, tag_id=tag_id)
+                    for recipe_id, tags in recipe_tags.items()
+                    for tag_id in tags
+                )
+                Recipe.objects.bulk_update(
+                    [
+                        Recipe(id=recipe_id, tag_ids=tags)
+                        for recipe_id, tags in recipe_tags.items()
+                    ],
+                    ('tag_ids',),
+                )
+
+    def create_edges(self, model, target_field, total, user_ids, targets):
+        for batch in self.batches(total):
+            pairs = {
+                (self.rng.choice(user_ids), target_id)
+                for target_id in targets.sample(len(batch))
+            }
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    (
+                        model(user_id=user_id, **{target_field: target_id})
+                        for user_id, target_id in pairs
+                        if user_id != target_id or target_field != 'author_id'
+                    ),
+                    ignore_conflicts=True,
+                    update_counters=False,
+                )
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.3 on 2026-10-18 19:55
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('Favorites', 'recipe', 'recipes.Recipe', 'favorites_count'),
+    ('Shopping', 'recipe', 'recipes.Recipe', 'shopping_count'),
+    ('Subscribe', 'author', 'users.User', 'followers_count'),
+    ('Recipe', 'author', 'users.User', 'recipes_count'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for source, relation, target, counter in COUNTERS:
+        model = apps.get_model('recipes', source)
+        total = model.objects.filter(
+            **{relation: OuterRef('pk')}
+        ).order_by().values(relation).annotate(
+            total=Count('pk')
+        ).values('total')
+        apps.get_model(target).objects.update(
+            **{counter: Coalesce(Subquery(total), 0)}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_counters'),
+        ('recipes', '0004_recipe_feed_ordering'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество добавлений в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество добавлений в покупки'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
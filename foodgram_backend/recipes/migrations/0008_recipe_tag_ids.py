@@ -0,0 +1,55 @@
+# Generated by Django 3.2.3 on 2026-10-18 21:40
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import recipes.fields
+
+BACKFILL = '''
+UPDATE recipes_recipe
+SET tag_ids = recipe_tags.tag_ids
+FROM (
+    SELECT recipe_id, array_agg(tag_id ORDER BY tag_id) AS tag_ids
+    FROM recipes_recipe_tags
+    GROUP BY recipe_id
+) AS recipe_tags
+WHERE recipe_tags.recipe_id = recipes_recipe.id;
+'''
+
+
+def run_on_postgresql(sql):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_ids',
+            field=recipes.fields.IntegerArrayField(
+                base_field=models.IntegerField(),
+                blank=True,
+                default=list,
+                editable=False,
+                size=None,
+                verbose_name='Id тегов рецепта',
+            ),
+        ),
+        migrations.RunPython(
+            run_on_postgresql(BACKFILL),
+            migrations.RunPython.noop,
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=['tag_ids'], name='recipe_tag_ids_idx',
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_tag_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('fan_out', 'Разослать рецепт подписчикам'), ('backfill', 'Заполнить ленту после подписки'), ('prune', 'Очистить ленту после отписки')], max_length=16, verbose_name='Задача')),
+                ('recipe_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='Id рецепта')),
+                ('user_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='Id подписчика')),
+                ('author_id', models.PositiveIntegerField(blank=True, null=True, verbose_name='Id автора')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+            ],
+            options={
+                'verbose_name': 'Задача ленты подписок',
+                'verbose_name_plural': 'Задачи ленты подписок',
+                'ordering': ('id',),
+            },
+        ),
+    ]
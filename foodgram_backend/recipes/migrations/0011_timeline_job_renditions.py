@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 21:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_catalog_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='timelinejob',
+            name='kind',
+            field=models.CharField(choices=[('fan_out', 'Разослать рецепт подписчикам'), ('backfill', 'Заполнить ленту после подписки'), ('prune', 'Очистить ленту после отписки'), ('renditions', 'Создать копии изображения рецепта')], max_length=16, verbose_name='Задача'),
+        ),
+    ]
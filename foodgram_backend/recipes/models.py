@@ -1,8 +1,12 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
 
 from users.models import User
+from .counters import CountedQuerySet
+from .fields import IntegerArrayField
 from users import quantity as q
 
 
@@ -58,6 +62,20 @@ class Tag(models.Model):
         return self.name
 
 
+class CatalogVersion(models.Model):
+    """Версия справочников. Строка в базе, а не ключ кеша: вытеснение
+    из кеша не должно выглядеть как изменение справочников."""
+
+    version = models.BigIntegerField(verbose_name='Версия')
+
+    class Meta:
+        verbose_name = 'Версия справочников'
+        verbose_name_plural = 'Версии справочников'
+
+    def __str__(self):
+        return str(self.version)
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -85,6 +103,13 @@ class Recipe(models.Model):
         verbose_name='Тег рецепта',
         related_name='recipes',
     )
+    tag_ids = IntegerArrayField(
+        models.IntegerField(),
+        verbose_name='Id тегов рецепта',
+        default=list,
+        blank=True,
+        editable=False,
+    )
     cooking_time = models.PositiveSmallIntegerField(
         verbose_name='Время приготовления',
         validators=(
@@ -104,11 +129,51 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Количество добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    shopping_count = models.PositiveIntegerField(
+        verbose_name='Количество добавлений в покупки',
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+
+    objects = CountedQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            GinIndex(
+                fields=('search_vector',),
+                name='recipe_search_vector_idx',
+            ),
+            GinIndex(
+                fields=('name',),
+                name='recipe_name_trgm_idx',
+                opclasses=('gin_trgm_ops',),
+            ),
+            GinIndex(
+                fields=('tag_ids',),
+                name='recipe_tag_ids_idx',
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -172,6 +237,8 @@ class Subscribe(models.Model):
         related_name='author',
     )
 
+    objects = CountedQuerySet.as_manager()
+
     class Meta:
         ordering = ('id',)
         verbose_name = 'Подписка'
@@ -205,6 +272,8 @@ class FavoritesShopingParrents(models.Model):
         related_name='%(class)s',
     )
 
+    objects = CountedQuerySet.as_manager()
+
     class Meta:
         abstract = True
         ordering = ('user',)
@@ -232,3 +301,95 @@ class Shopping(FavoritesShopingParrents):
                 name='unique_shopping',
             ),
         ]
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        verbose_name='Подписчик',
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name='Автор',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации рецепта')
+
+    class Meta:
+        ordering = ('-pub_date', '-recipe')
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Лента подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe',),
+                name='unique_timeline_entry',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='timeline_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=('user', 'author'),
+                name='timeline_user_author_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
+
+
+class TimelineJob(models.Model):
+    """Отложенное обновление ленты подписок или копий изображения.
+
+    Пишется в той же транзакции, что и изменение рецепта или подписки,
+    и переживает перезапуск процесса. Выполняется командой
+    drain_timeline.
+    """
+
+    FAN_OUT = 'fan_out'
+    BACKFILL = 'backfill'
+    PRUNE = 'prune'
+    RENDITIONS = 'renditions'
+    KINDS = (
+        (FAN_OUT, 'Разослать рецепт подписчикам'),
+        (BACKFILL, 'Заполнить ленту после подписки'),
+        (PRUNE, 'Очистить ленту после отписки'),
+        (RENDITIONS, 'Создать копии изображения рецепта'),
+    )
+
+    kind = models.CharField(
+        verbose_name='Задача',
+        max_length=q.MAX_LENGTH_FOR_TIMELINE_JOB,
+        choices=KINDS,
+    )
+    recipe_id = models.PositiveIntegerField(
+        verbose_name='Id рецепта', null=True, blank=True,
+    )
+    user_id = models.PositiveIntegerField(
+        verbose_name='Id подписчика', null=True, blank=True,
+    )
+    author_id = models.PositiveIntegerField(
+        verbose_name='Id автора', null=True, blank=True,
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Создана', auto_now_add=True,
+    )
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Задача ленты подписок'
+        verbose_name_plural = 'Задачи ленты подписок'
+
+    def __str__(self):
+        return f'{self.get_kind_display()} #{self.id}'
@@ -0,0 +1,77 @@
+"""Уменьшенные копии изображений рецептов в форматах WebP и JPEG.
+
+Копии лежат рядом с оригиналом: recipes/images/<имя>.<размер>.<формат>.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from users import quantity as q
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+
+def rendition_name(name, rendition, extension):
+    root, _ = os.path.splitext(name)
+    return f'{root}.{rendition}.{extension}'
+
+
+def renditions_exist(name, storage=default_storage):
+    return storage.exists(rendition_name(
+        name, next(iter(q.RECIPE_IMAGE_RENDITIONS)), next(iter(IMAGE_FORMATS))
+    ))
+
+
+def build_renditions(name, storage=default_storage):
+    """Создаёт все копии изображения, заменяя существующие."""
+    with storage.open(name) as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    for rendition, size in q.RECIPE_IMAGE_RENDITIONS.items():
+        variant = image.copy()
+        variant.thumbnail(size, Image.LANCZOS)
+        for extension, image_format in IMAGE_FORMATS.items():
+            buffer = BytesIO()
+            if image_format == 'JPEG' or variant.mode not in ('RGB', 'RGBA'):
+                variant = variant.convert('RGB')
+            variant.save(buffer, image_format,
+                         quality=q.RECIPE_IMAGE_QUALITY)
+            target = rendition_name(name, rendition, extension)
+            storage.delete(target)
+            storage.save(target, ContentFile(buffer.getvalue()))
+
+
+def delete_renditions(name, storage=default_storage):
+    for rendition in q.RECIPE_IMAGE_RENDITIONS:
+        for extension in IMAGE_FORMATS:
+            storage.delete(rendition_name(name, rendition, extension))
+
+
+def ensure_renditions(name, storage=default_storage):
+    if not name or renditions_exist(name, storage):
+        return
+    try:
+        build_renditions(name, storage)
+    except OSError as error:
+        logger.warning('Не удалось создать копии изображения %s: %s',
+                       name, error)
+
+
+def rendition_urls(image, request=None, storage=default_storage):
+    if not image:
+        return None
+    urls = {}
+    for rendition in q.RECIPE_IMAGE_RENDITIONS:
+        urls[rendition] = {}
+        for extension in IMAGE_FORMATS:
+            url = storage.url(rendition_name(image.name, rendition, extension))
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[rendition][extension] = url
+    return urls
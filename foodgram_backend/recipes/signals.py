@@ -0,0 +1,138 @@
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_init, post_save, pre_delete
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .catalog import bump_catalog_version
+from .counters import shift_counters
+from .models import (
+    Favorites, Ingredient, Recipe, Shopping, Subscribe, Tag, TimelineJob
+)
+from .renditions import delete_renditions
+from .tagging import sync_tag_ids, tagged_recipe_ids
+from .timeline import enqueue
+from users.models import User
+
+AUTHOR_FIELDS = {'username', 'first_name', 'last_name', 'email'}
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def catalog_changed(**kwargs):
+    bump_catalog_version()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, reverse, pk_set, **kwargs):
+    """Со стороны рецепта массив меняется в памяти: если tag_ids уже
+    выставлен сериализатором, запись не нужна. При очистке со стороны
+    тега рецепты запоминаются до удаления связей."""
+    if reverse and action == 'pre_clear':
+        instance._cleared_recipe_ids = tagged_recipe_ids(instance.pk)
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        sync_tag_ids(
+            instance.__dict__.pop('_cleared_recipe_ids', ())
+            if pk_set is None else pk_set
+        )
+        return
+    tag_ids = set(instance.tag_ids)
+    if action == 'post_add':
+        tag_ids |= pk_set
+    elif action == 'post_remove':
+        tag_ids -= pk_set
+    else:
+        tag_ids = set()
+    if sorted(tag_ids) != instance.tag_ids:
+        instance.tag_ids = sorted(tag_ids)
+        Recipe.objects.filter(pk=instance.pk).update(tag_ids=instance.tag_ids)
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleting(instance, **kwargs):
+    instance._tagged_recipe_ids = tagged_recipe_ids(instance.pk)
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(instance, **kwargs):
+    sync_tag_ids(instance.__dict__.pop('_tagged_recipe_ids', ()))
+
+
+@receiver(post_save, sender=Favorites)
+@receiver(post_save, sender=Shopping)
+@receiver(post_save, sender=Subscribe)
+@receiver(post_save, sender=Recipe)
+def counted_object_created(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        shift_counters(sender, [instance], 1)
+
+
+@receiver(post_delete, sender=Favorites)
+@receiver(post_delete, sender=Shopping)
+@receiver(post_delete, sender=Subscribe)
+@receiver(post_delete, sender=Recipe)
+def counted_object_deleted(sender, instance, **kwargs):
+    shift_counters(sender, [instance], -1)
+
+
+def loaded_image_name(recipe):
+    """Имя изображения без загрузки отложенного поля, иначе None."""
+    image = recipe.__dict__.get('image')
+    return getattr(image, 'name', image)
+
+
+@receiver(post_init, sender=Recipe)
+def recipe_loaded(instance, **kwargs):
+    instance._saved_image_name = loaded_image_name(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(instance, created, raw, **kwargs):
+    """Копии строятся в drain_timeline и только для нового изображения,
+    копии заменённого удаляются после коммита."""
+    name = loaded_image_name(instance)
+    old_name = instance._saved_image_name
+    instance._saved_image_name = name
+    if raw or (not created and name in (old_name, None)):
+        return
+    if name:
+        enqueue(TimelineJob.RENDITIONS, recipe_id=instance.id)
+    if old_name and not created:
+        transaction.on_commit(lambda: delete_renditions(old_name))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(instance, created, raw, **kwargs):
+    if created and not raw:
+        enqueue(TimelineJob.FAN_OUT, recipe_id=instance.id)
+
+
+@receiver(post_save, sender=Subscribe)
+def subscription_created(instance, created, raw, **kwargs):
+    if created and not raw:
+        enqueue(
+            TimelineJob.BACKFILL,
+            user_id=instance.user_id, author_id=instance.author_id,
+        )
+
+
+@receiver(post_delete, sender=Subscribe)
+def subscription_deleted(instance, **kwargs):
+    enqueue(
+        TimelineJob.PRUNE,
+        user_id=instance.user_id, author_id=instance.author_id,
+    )
+
+
+@receiver(post_save, sender=User)
+def author_changed(instance, created, raw, update_fields, **kwargs):
+    """Автор входит в представление рецептов, их кеш устаревает."""
+    if created or raw or update_fields and not AUTHOR_FIELDS & set(
+        update_fields
+    ):
+        return
+    Recipe.objects.filter(author=instance).update(updated_at=timezone.now())
@@ -0,0 +1,33 @@
+"""Денормализованный Recipe.tag_ids для фильтра по тегам без JOIN.
+
+Связи рецептов с тегами остаются источником истины, массив
+пересчитывается по ним.
+"""
+from collections import defaultdict
+
+from .models import Recipe
+
+
+def tagged_recipe_ids(tag_id):
+    return list(Recipe.tags.through.objects.filter(
+        tag_id=tag_id
+    ).values_list('recipe_id', flat=True))
+
+
+def sync_tag_ids(recipe_ids):
+    """Пересчитывает Recipe.tag_ids по связям рецептов с тегами."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    tag_ids = defaultdict(list)
+    for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('tag_id').values_list('recipe_id', 'tag_id'):
+        tag_ids[recipe_id].append(tag_id)
+    Recipe.objects.bulk_update(
+        [
+            Recipe(id=recipe_id, tag_ids=tag_ids[recipe_id])
+            for recipe_id in recipe_ids
+        ],
+        ('tag_ids',),
+    )
@@ -0,0 +1,254 @@
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from .catalog import CATALOG_VERSION_KEY, get_catalog_version, tag_catalog
+from .models import (Favorites, Recipe, Subscribe, Tag, TimelineEntry,
+                     TimelineJob)
+from .renditions import renditions_exist
+from .timeline import drain
+from foodgram_backend.db_router import ReplicaRouter
+from users.models import User
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+})
+class CatalogVersionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_evicted_version_is_not_a_bump(self):
+        version = get_catalog_version()
+        cache.delete(CATALOG_VERSION_KEY)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_catalog_version(), version)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_catalog_version(), version)
+
+    def test_bump(self):
+        version = get_catalog_version()
+        Tag.objects.create(name='Новый', slug='new', color='#123456')
+        bumped = get_catalog_version()
+        self.assertGreater(bumped, version)
+        cache.clear()
+        self.assertEqual(get_catalog_version(), bumped)
+
+    def test_snapshot_reads_primary(self):
+        Tag.objects.create(name='Новый', slug='new', color='#123456')
+        with mock.patch.object(
+            ReplicaRouter, 'db_for_read', return_value='lagging_replica'
+        ):
+            self.assertIn('new', tag_catalog.ids_by_slug())
+
+
+class TimelineOutboxTests(TestCase):
+    """Лента обновляется задачами из очереди в базе."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.author = (
+            User.objects.create(
+                username=name, email=f'{name}@example.com',
+                first_name='Имя', last_name='Фамилия',
+            )
+            for name in ('reader', 'author')
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Текст', cooking_time=5,
+        )
+        TimelineJob.objects.all().delete()
+
+    def feed(self):
+        return list(TimelineEntry.objects.filter(
+            user=self.reader
+        ).values_list('recipe_id', flat=True))
+
+    def test_jobs_are_written_with_changes(self):
+        Subscribe.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.feed(), [])
+        self.assertEqual(drain(), 1)
+        self.assertEqual(self.feed(), [self.recipe.id])
+        self.assertFalse(TimelineJob.objects.exists())
+
+    def test_fan_out_and_prune(self):
+        Subscribe.objects.create(user=self.reader, author=self.author)
+        recipe = Recipe.objects.create(
+            author=self.author, name='Новый', text='Текст', cooking_time=5,
+        )
+        call_command('drain_timeline', stdout=StringIO())
+        self.assertCountEqual(self.feed(), [self.recipe.id, recipe.id])
+        Subscribe.objects.filter(user=self.reader).delete()
+        call_command('drain_timeline', stdout=StringIO())
+        self.assertEqual(self.feed(), [])
+
+    def test_jobs_are_idempotent(self):
+        Subscribe.objects.create(user=self.reader, author=self.author)
+        job = TimelineJob.objects.get()
+        drain()
+        job.save()
+        self.assertEqual(drain(), 1)
+        self.assertEqual(self.feed(), [self.recipe.id])
+
+    def test_failed_job_stays_queued(self):
+        Subscribe.objects.create(user=self.reader, author=self.author)
+        with mock.patch(
+            'recipes.timeline.backfill', side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            drain()
+        self.assertEqual(TimelineJob.objects.count(), 1)
+        self.assertEqual(self.feed(), [])
+        drain()
+        self.assertEqual(self.feed(), [self.recipe.id])
+
+    def test_deleted_recipe(self):
+        Recipe.objects.create(
+            author=self.author, name='Удалённый', text='Текст',
+            cooking_time=5,
+        ).delete()
+        self.assertEqual(drain(), 1)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+
+class BulkDeleteTests(TestCase):
+    """bulk_delete удаляет одним запросом и сдвигает счётчики."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create(
+                username=f'user{index}', email=f'user{index}@example.com',
+                first_name='Имя', last_name='Фамилия',
+            )
+            for index in range(3)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.users[0], name=f'Рецепт {index}', text='Текст',
+                cooking_time=5,
+            )
+            for index in range(2)
+        ]
+        Favorites.objects.bulk_create(
+            Favorites(user=user, recipe=recipe)
+            for user in cls.users for recipe in cls.recipes
+        )
+
+    def favorites_counts(self):
+        return list(Recipe.objects.order_by('id').values_list(
+            'favorites_count', flat=True
+        ))
+
+    def test_counters(self):
+        self.assertEqual(self.favorites_counts(), [3, 3])
+        with self.assertNumQueries(3):
+            deleted = Favorites.objects.filter(
+                user__in=self.users[:2]
+            ).exclude(recipe=self.recipes[1], user=self.users[1]).bulk_delete()
+        self.assertEqual(deleted, 3)
+        self.assertEqual(self.favorites_counts(), [1, 2])
+
+    def test_nothing_to_delete(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                Favorites.objects.filter(user_id=0).bulk_delete(), 0
+            )
+        self.assertEqual(self.favorites_counts(), [3, 3])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RenditionJobTests(TestCase):
+    """Копии изображения строятся задачей из очереди и только для нового
+    изображения."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@example.com',
+            first_name='Имя', last_name='Фамилия',
+        )
+
+    def image(self, name):
+        buffer = BytesIO()
+        Image.new('RGB', (64, 48), (200, 120, 40)).save(buffer, 'PNG')
+        return ContentFile(buffer.getvalue(), name=name)
+
+    def jobs(self):
+        return TimelineJob.objects.filter(kind=TimelineJob.RENDITIONS)
+
+    def test_new_image(self):
+        recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст', cooking_time=5,
+            image=self.image('first.png'),
+        )
+        self.assertEqual(self.jobs().count(), 1)
+        self.assertFalse(renditions_exist(recipe.image.name))
+        drain()
+        self.assertTrue(renditions_exist(recipe.image.name))
+
+    def test_unchanged_image(self):
+        recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст', cooking_time=5,
+            image=self.image('first.png'),
+        )
+        drain()
+        recipe.name = 'Новое название'
+        recipe.save()
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        recipe.save()
+        Recipe.objects.defer('image').get(pk=recipe.pk).save()
+        self.assertFalse(self.jobs().exists())
+
+    def test_replaced_image(self):
+        recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст', cooking_time=5,
+            image=self.image('first.png'),
+        )
+        drain()
+        old_name = recipe.image.name
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        recipe.image = self.image('second.png')
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.save()
+        self.assertFalse(renditions_exist(old_name))
+        self.assertEqual(self.jobs().count(), 1)
+        drain()
+        self.assertTrue(renditions_exist(recipe.image.name))
+
+
+class LoadTagsTests(TestCase):
+    """load_tags обновляет существующие по слагу теги и через COPY."""
+
+    def load(self, *options):
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.csv', encoding='utf-8'
+        ) as file:
+            file.write('Завтрак,#FF0000,breakfast\nУжин,#0000FF,dinner\n')
+            file.flush()
+            call_command(
+                'load_tags', '--path', file.name, *options, stdout=StringIO()
+            )
+        return dict(Tag.objects.values_list('slug', 'color'))
+
+    def test_updates_existing(self):
+        Tag.objects.create(name='Утро', slug='breakfast', color='#00FF00')
+        self.assertEqual(
+            self.load(), {'breakfast': '#FF0000', 'dinner': '#0000FF'}
+        )
+        self.assertEqual(Tag.objects.get(slug='breakfast').name, 'Завтрак')
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY есть в PostgreSQL')
+    def test_copy_updates_existing(self):
+        Tag.objects.create(name='Утро', slug='breakfast', color='#00FF00')
+        self.assertEqual(
+            self.load('--copy'), {'breakfast': '#FF0000', 'dinner': '#0000FF'}
+        )
+        self.assertEqual(Tag.objects.get(slug='breakfast').name, 'Завтрак')
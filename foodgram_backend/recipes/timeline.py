@@ -0,0 +1,130 @@
+"""Лента подписок: рецепты раскладываются по подписчикам при записи.
+
+Изменения рецептов и подписок записывают задачу в TimelineJob в своей
+транзакции, ленту обновляет команда drain_timeline. Через ту же очередь
+создаются копии нового изображения рецепта.
+"""
+from itertools import islice
+
+from django.db import transaction
+
+from .models import Recipe, Subscribe, TimelineEntry, TimelineJob
+from .renditions import ensure_renditions
+from users import quantity as q
+
+
+def enqueue(kind, **ids):
+    TimelineJob.objects.create(kind=kind, **ids)
+
+
+def run_job(job):
+    if job.kind == TimelineJob.FAN_OUT:
+        fan_out(job.recipe_id)
+    elif job.kind == TimelineJob.BACKFILL:
+        backfill(job.user_id, job.author_id)
+    elif job.kind == TimelineJob.PRUNE:
+        prune(job.user_id, job.author_id)
+    elif job.kind == TimelineJob.RENDITIONS:
+        ensure_renditions(Recipe.objects.filter(
+            id=job.recipe_id
+        ).values_list('image', flat=True).first())
+
+
+def drain(limit=None):
+    """Выполняет задачи по порядку id, каждую в своей транзакции.
+
+    Задача удаляется вместе с записью результата, при ошибке остаётся
+    в очереди. Все задачи идемпотентны, повтор после сбоя безопасен.
+    Возвращает число выполненных задач.
+    """
+    done = 0
+    while limit is None or done < limit:
+        with transaction.atomic():
+            job = TimelineJob.objects.select_for_update(
+                skip_locked=True
+            ).first()
+            if job is None:
+                break
+            run_job(job)
+            job.delete()
+        done += 1
+    return done
+
+
+def iter_batches(queryset, batch_size=q.TIMELINE_BATCH_SIZE):
+    """Пачки values_list(id, ...) с продвижением по id без OFFSET."""
+    last_id = 0
+    while True:
+        batch = list(
+            queryset.filter(id__gt=last_id).order_by('id')[:batch_size]
+        )
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1][0]
+
+
+def insert_entries(entries, batch_size=q.TIMELINE_BATCH_SIZE):
+    """Записи ленты кусками по batch_size: bulk_create превращает
+    генератор в список целиком."""
+    entries = iter(entries)
+    while True:
+        chunk = list(islice(entries, batch_size))
+        if not chunk:
+            return
+        TimelineEntry.objects.bulk_create(chunk, ignore_conflicts=True)
+
+
+def fan_out(recipe_id):
+    """Добавляет новый рецепт в ленты всех подписчиков автора."""
+    recipe = Recipe.objects.filter(id=recipe_id).values_list(
+        'author_id', 'pub_date'
+    ).first()
+    if recipe is None:
+        return
+    author_id, pub_date = recipe
+    followers = Subscribe.objects.filter(
+        author_id=author_id
+    ).values_list('id', 'user_id')
+    for batch in iter_batches(followers):
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(
+                    user_id=user_id,
+                    author_id=author_id,
+                    recipe_id=recipe_id,
+                    pub_date=pub_date,
+                )
+                for _, user_id in batch
+            ),
+            ignore_conflicts=True,
+        )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные рецепты автора."""
+    recipes = Recipe.objects.filter(
+        author_id=author_id
+    ).values_list('id', 'pub_date')
+    for batch in iter_batches(recipes):
+        if not Subscribe.objects.filter(
+            user_id=user_id, author_id=author_id
+        ).exists():
+            return
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(
+                    user_id=user_id,
+                    author_id=author_id,
+                    recipe_id=recipe_id,
+                    pub_date=pub_date,
+                )
+                for recipe_id, pub_date in batch
+            ),
+            ignore_conflicts=True,
+        )
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты рецепты автора после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
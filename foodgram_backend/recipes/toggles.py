@@ -0,0 +1,112 @@
+"""Добавление и удаление связи пользователя с рецептом или автором.
+
+На PostgreSQL вставка или удаление строки, сдвиг денормализованного
+счётчика и задача ленты подписок выполняются одним оператором с CTE,
+он же возвращает цель связи для ответа. Повтор отсекается уникальным
+ограничением через ON CONFLICT DO NOTHING, поэтому одновременные
+одинаковые запросы не падают. На других базах — ORM и сигналы.
+"""
+from django.db import IntegrityError, connections, router, transaction
+
+from .counters import COUNTED_RELATIONS
+from .models import Subscribe, TimelineJob
+
+# Задачи ленты при добавлении и удалении связи.
+LINK_JOBS = {
+    Subscribe: (TimelineJob.BACKFILL, TimelineJob.PRUNE),
+}
+
+
+def toggle_link(model, user, target_id, add):
+    """Цель связи с атрибутом toggled или None, если цели нет.
+
+    toggled ложен, если связь уже была при добавлении или её не было
+    при удалении. После удаления без SQL-пути цель не загружается,
+    у неё заполнен только первичный ключ.
+    """
+    try:
+        target_id = int(target_id)
+    except (TypeError, ValueError):
+        return None
+    alias = router.db_for_write(model)
+    if connections[alias].vendor == 'postgresql':
+        return toggle_link_sql(model, user, target_id, add, alias)
+    relation, _ = COUNTED_RELATIONS[model._meta.label][0]
+    target_model = model._meta.get_field(relation).related_model
+    if not add:
+        links = model.objects.using(alias).filter(
+            user=user, **{f'{relation}_id': target_id}
+        )
+        if model in LINK_JOBS:
+            deleted = links.delete()[0]
+        else:
+            deleted = links.bulk_delete()
+        if deleted:
+            target = target_model(pk=target_id)
+            target.toggled = True
+            return target
+    target = target_model.objects.using(alias).filter(pk=target_id).first()
+    if target is None:
+        return None
+    if not add:
+        target.toggled = False
+        return target
+    try:
+        with transaction.atomic(using=alias):
+            model.objects.using(alias).create(user=user, **{relation: target})
+    except IntegrityError:
+        target.toggled = False
+    else:
+        target.toggled = True
+    return target
+
+
+def toggle_link_sql(model, user, target_id, add, alias):
+    """То же одним запросом: CTE с INSERT или DELETE и UPDATE счётчика."""
+    quote = connections[alias].ops.quote_name
+    relation, counter = COUNTED_RELATIONS[model._meta.label][0]
+    field = model._meta.get_field(relation)
+    target_model = field.related_model
+    table = quote(model._meta.db_table)
+    target_table = quote(target_model._meta.db_table)
+    pk = quote(target_model._meta.pk.column)
+    user_column = quote(model._meta.get_field('user').column)
+    target_column = quote(field.column)
+    counter = quote(target_model._meta.get_field(counter).column)
+    if add:
+        change = (
+            f'INSERT INTO {table} ({user_column}, {target_column}) '
+            f'SELECT %s, {pk} FROM target ON CONFLICT DO NOTHING'
+        )
+        shift = f'{counter} + 1'
+    else:
+        change = (
+            f'DELETE FROM {table} WHERE {user_column} = %s '
+            f'AND {target_column} IN (SELECT {pk} FROM target)'
+        )
+        shift = f'GREATEST({counter} - 1, 0)'
+    ctes = [
+        f'target AS (SELECT * FROM {target_table} WHERE {pk} = %s)',
+        f'changed AS ({change} RETURNING {user_column}, {target_column})',
+        f'counted AS (UPDATE {target_table} SET {counter} = {shift} '
+        f'WHERE {pk} IN (SELECT {target_column} FROM changed))',
+    ]
+    params = [target_id, user.pk]
+    if model in LINK_JOBS:
+        job = TimelineJob._meta
+        ctes.append(
+            f'queued AS (INSERT INTO {quote(job.db_table)} ('
+            + ', '.join(
+                quote(job.get_field(name).column) for name in
+                ('kind', 'user_id', f'{relation}_id', 'created_at')
+            )
+            + f') SELECT %s, {user_column}, {target_column}, NOW() '
+            f'FROM changed)'
+        )
+        params.append(LINK_JOBS[model][0 if add else 1])
+    return next(iter(target_model.objects.raw(
+        'WITH {0} SELECT target.*, EXISTS(SELECT 1 FROM changed) AS toggled '
+        'FROM target'.format(', '.join(ctes)),
+        params,
+        using=alias,
+    )), None)
@@ -20,8 +20,8 @@ class UserAdmin(UserAdmin):
 
     @admin.display(description='Количество подписчиков')
     def subscriber(self, user):
-        return user.subscriber.count()
+        return user.followers_count
 
     @admin.display(description='Количество рецептов')
     def recipes(self, user):
-        return user.recipes.count()
+        return user.recipes_count
@@ -27,6 +27,12 @@ class User(AbstractUser):
                                  max_length=q.MAX_LEN_FOR_LNAME,
                                  blank=False,
                                  null=False,)
+    recipes_count = models.PositiveIntegerField('Количество рецептов',
+                                                default=0,
+                                                editable=False,)
+    followers_count = models.PositiveIntegerField('Количество подписчиков',
+                                                  default=0,
+                                                  editable=False,)
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -7,3 +7,22 @@ AMOUNT_MIN_VALUE = 1
 PAGINATION_PAGE_SIZE = 6
 MAX_LENGTH_FOR_RECIPES = 200
 MAX_LENGTH_FOR_COLOR = 7
+MAX_LENGTH_FOR_TIMELINE_JOB = 16
+# Меняется вместе с триггером search_vector новой миграцией,
+# см. recipes/migrations/0003_recipe_search.py.
+SEARCH_CONFIG = 'russian'
+SHOPPING_LIST_CHUNK_SIZE = 100
+CATALOG_CACHE_MAX_AGE = 60
+RECIPE_IMAGE_RENDITIONS = {
+    'thumb': (160, 160),
+    'card': (480, 480),
+    'full': (1280, 1280),
+}
+RECIPE_IMAGE_QUALITY = 80
+TIMELINE_BATCH_SIZE = 1000
+TIMELINE_DRAIN_INTERVAL = 1
+RECIPE_CACHE_TIMEOUT = 60 * 60 * 24
+BULK_RECIPES_MAX_COUNT = 100
+COMPRESSION_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5